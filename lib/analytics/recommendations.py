@@ -0,0 +1,29 @@
+from lib.db.connection import transaction
+
+def rebuild():
+    # Full recompute of the recommendation index. Triggers keep it current afterwards;
+    # this is only needed for data loaded before the triggers existed.
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM author_category_weights")
+        cursor.execute("DELETE FROM magazine_activity")
+        cursor.execute("""
+            INSERT INTO magazine_activity (magazine_id, category, article_count)
+            SELECT magazines.id, magazines.category, COUNT(articles.id)
+            FROM magazines
+            LEFT JOIN articles ON articles.magazine_id = magazines.id
+            GROUP BY magazines.id
+        """)
+        cursor.execute("""
+            INSERT INTO author_category_weights (author_id, category, weight)
+            SELECT articles.author_id, magazines.category, COUNT(*)
+            FROM articles
+            JOIN magazines ON magazines.id = articles.magazine_id
+            GROUP BY articles.author_id, magazines.category
+        """)
+        return {
+            "author_category_weights": cursor.execute("SELECT COUNT(*) FROM author_category_weights").fetchone()[0],
+            "magazine_activity": cursor.execute("SELECT COUNT(*) FROM magazine_activity").fetchone()[0],
+        }
+
+if __name__ == "__main__":
+    print(rebuild())
@@ -0,0 +1,109 @@
+import numpy as np
+from lib.db.connection import fetch_all, transaction
+
+try:
+    from scipy import sparse
+except ImportError: # Dense NumPy matrices work too, they just use more memory
+    sparse = None
+
+METRICS = ("cosine", "jaccard")
+BLOCK_SIZE = 1024 # Rows scored at a time; bounds the dense fallback to BLOCK_SIZE x n
+
+def incidence_matrix():
+    # Author x magazine 0/1 matrix built from one grouped pass over articles.
+    # Returns (author_ids, magazine_ids, matrix); row/column i maps to author_ids[i]/magazine_ids[i].
+    rows = fetch_all("SELECT DISTINCT author_id, magazine_id FROM articles")
+    pairs = np.array([(row[0], row[1]) for row in rows], dtype=np.int64).reshape(-1, 2)
+    author_ids, author_index = np.unique(pairs[:, 0], return_inverse=True)
+    magazine_ids, magazine_index = np.unique(pairs[:, 1], return_inverse=True)
+    shape = (len(author_ids), len(magazine_ids))
+    if sparse is not None:
+        data = np.ones(len(pairs), dtype=np.float64)
+        matrix = sparse.csr_matrix((data, (author_index, magazine_index)), shape=shape)
+    else:
+        matrix = np.zeros(shape, dtype=np.float64)
+        matrix[author_index, magazine_index] = 1.0
+    return author_ids, magazine_ids, matrix
+
+def _sparse_top_k(shared, start, degree, k, metric):
+    # Scores only the stored overlaps of a sparse block; pairs with nothing in common
+    # score 0 under both metrics and are never kept, so they are never materialized.
+    shared = shared.tocoo()
+    rows, cols, overlap = shared.row.astype(np.int64) + start, shared.col.astype(np.int64), shared.data
+    if metric == "cosine":
+        scores = overlap / np.sqrt(degree[rows] * degree[cols])
+    else:
+        scores = overlap / (degree[rows] + degree[cols] - overlap)
+    keep = (rows != cols) & (scores > 0) # Never recommend yourself
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    order = np.lexsort((cols, -scores, rows)) # By row, best score first, lower index on ties
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    run_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.array([], dtype=np.int64)
+    rank = np.arange(len(rows)) - np.repeat(run_starts, np.diff(np.r_[run_starts, len(rows)]))
+    best = rank < k
+    return rows[best], cols[best], scores[best]
+
+def top_k(matrix, k, metric="cosine"):
+    # Top-k most similar rows for every row of a 0/1 matrix, excluding the row itself.
+    # Returns (row, neighbour, score) arrays with ranks in descending score order.
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}.")
+    n = matrix.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=np.float64)
+    degree = np.asarray(matrix.sum(axis=1)).ravel()
+    transposed = matrix.T.tocsc() if sparse is not None and sparse.issparse(matrix) else matrix.T
+    sources, neighbours, scores = [], [], []
+    for start in range(0, n, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n)
+        shared = matrix[start:stop] @ transposed # |A ∩ B| for the block against every row
+        if sparse is not None and sparse.issparse(shared):
+            for found, part in zip((sources, neighbours, scores), _sparse_top_k(shared, start, degree, k, metric)):
+                found.append(part)
+            continue
+        shared = np.asarray(shared)
+        if metric == "cosine":
+            denominator = np.sqrt(np.outer(degree[start:stop], degree))
+        else:
+            denominator = degree[start:stop, None] + degree[None, :] - shared
+        with np.errstate(divide="ignore", invalid="ignore"):
+            block = np.where(denominator > 0, shared / denominator, 0.0)
+        block[np.arange(stop - start), np.arange(start, stop)] = -1.0 # Never recommend yourself
+        best = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(block, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        sources.append(np.repeat(np.arange(start, stop), k))
+        neighbours.append(best.ravel())
+        scores.append(best_scores.ravel())
+    sources, neighbours, scores = np.concatenate(sources), np.concatenate(neighbours), np.concatenate(scores)
+    keep = scores > 0
+    return sources[keep], neighbours[keep], scores[keep]
+
+def _persist(table, key, ids, sources, neighbours, scores):
+    records = []
+    rank = 0
+    for i in range(len(sources)):
+        rank = rank + 1 if i and sources[i] == sources[i - 1] else 0
+        records.append((int(ids[sources[i]]), int(ids[neighbours[i]]), float(scores[i]), rank))
+    with transaction() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.executemany(
+            f"INSERT INTO {table} ({key}, similar_{key}, score, rank) VALUES (?, ?, ?, ?)", records
+        )
+    return len(records)
+
+def rebuild(k=10, metric="cosine"):
+    # Recompute and store top-k similar authors and magazines; returns rows written per table.
+    author_ids, magazine_ids, matrix = incidence_matrix()
+    by_magazine = matrix.T.tocsr() if sparse is not None else matrix.T
+    return {
+        "author_similarity": _persist("author_similarity", "author_id", author_ids, *top_k(matrix, k, metric)),
+        "magazine_similarity": _persist("magazine_similarity", "magazine_id", magazine_ids, *top_k(by_magazine, k, metric)),
+    }
+
+if __name__ == "__main__":
+    print(rebuild())
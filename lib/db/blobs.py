@@ -0,0 +1,81 @@
+import hashlib
+import zlib
+from functools import lru_cache
+from lib.db.connection import fetch_one, transaction
+
+# Content-addressed, compressed storage for Article.content. Bodies are keyed by the
+# SHA-256 of their text, so syndicated copies of one body are stored once.
+CODECS = ("zlib", "lzma")
+INSERT_SQL = "INSERT OR IGNORE INTO content_blobs (hash, codec, body) VALUES (?, ?, ?)"
+MIGRATE_BATCH = 1000
+
+def _compress(codec, data):
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    import lzma # Only loaded when the lzma codec is in use
+    return lzma.compress(data)
+
+def _decompress(codec, body):
+    if codec == "zlib":
+        return zlib.decompress(body)
+    import lzma
+    return lzma.decompress(body)
+
+def digest(text):
+    # The key a body is stored under; also how content filters find blob-stored rows
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def encode(text, codec):
+    # (hash, INSERT_SQL params) for one body
+    if codec not in CODECS:
+        raise ValueError(f"codec must be one of {CODECS}.")
+    key = digest(text)
+    return key, (key, codec, _compress(codec, text.encode("utf-8")))
+
+@lru_cache(maxsize=1024)
+def load(key):
+    # Bodies never change for a given hash, so decoded text is safe to cache
+    row = fetch_one("SELECT codec, body FROM content_blobs WHERE hash = ?", (key,))
+    if row is None:
+        raise LookupError(f"Missing content blob {key}.")
+    return _decompress(row['codec'], row['body']).decode("utf-8")
+
+def migrate(codec="zlib"):
+    # Moves inline article bodies into the blob store in batches; returns articles moved
+    moved = 0
+    while True:
+        with transaction() as cursor:
+            rows = cursor.execute(
+                "SELECT id, content FROM articles WHERE content IS NOT NULL LIMIT ?", (MIGRATE_BATCH,)
+            ).fetchall()
+            if not rows:
+                return moved
+            encoded = {}
+            updates = []
+            for row in rows:
+                if row['content'] not in encoded:
+                    encoded[row['content']] = encode(row['content'], codec)
+                key, _ = encoded[row['content']]
+                updates.append((key, row['id']))
+            cursor.executemany(INSERT_SQL, [params for _, params in encoded.values()])
+            # Declared as storage-only moves, so the changelog trigger does not log them as edits
+            cursor.executemany("INSERT INTO content_moves (content_hash, article_id) VALUES (?, ?)", updates)
+            cursor.executemany("UPDATE articles SET content = NULL, content_hash = ? WHERE id = ?", updates)
+            cursor.execute("DELETE FROM content_moves")
+        moved += len(rows)
+
+def collect_garbage():
+    # Deletes bodies no article references any more; returns how many were removed
+    with transaction() as cursor:
+        cursor.execute("""
+            DELETE FROM content_blobs
+            WHERE hash NOT IN (SELECT content_hash FROM articles WHERE content_hash IS NOT NULL)
+        """)
+        return cursor.rowcount
+
+def stats():
+    row = fetch_one("""
+        SELECT COUNT(*) AS blobs, COALESCE(SUM(LENGTH(body)), 0) AS stored_bytes
+        FROM content_blobs
+    """)
+    return {"blobs": row['blobs'], "stored_bytes": row['stored_bytes']}
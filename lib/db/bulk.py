@@ -0,0 +1,128 @@
+import sqlite3
+from lib.db.connection import transaction, reader, max_variables, on_rollback
+from lib.db.query import compile_filters
+
+# Only upsert() needs RETURNING; deletes and updates select their ids first, so they work anywhere
+RETURNING_SUPPORTED = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def upsert(table, columns, rows, conflict, update=()):
+    # Multi-row INSERT ... ON CONFLICT ... RETURNING, chunked under the variable limit.
+    # Existing rows are only written when an update column actually changes, so re-running
+    # a feed costs no writes, WAL frames or changelog entries; the rows RETURNING skipped
+    # are read back with one chunked SELECT on the conflict column.
+    if not RETURNING_SUPPORTED:
+        raise RuntimeError(f"upsert needs SQLite 3.35+ for RETURNING; this Python has {sqlite3.sqlite_version}.")
+    column_list = ", ".join(columns)
+    placeholder = "(" + ", ".join("?" for _ in columns) + ")"
+    if update:
+        set_clause = ", ".join(f"{c} = excluded.{c}" for c in update)
+        changed = " OR ".join(f"{c} IS NOT excluded.{c}" for c in update)
+        action = f"DO UPDATE SET {set_clause} WHERE {changed}"
+    else:
+        action = "DO NOTHING"
+    limit = max_variables()
+    per_statement = max(1, limit // len(columns))
+    returned = []
+    with transaction() as cursor:
+        for chunk in chunked(rows, per_statement):
+            sql = f"""
+                INSERT INTO {table} ({column_list})
+                VALUES {", ".join(placeholder for _ in chunk)}
+                ON CONFLICT({conflict}) {action}
+                RETURNING id, {column_list}
+            """
+            returned.extend(cursor.execute(sql, [value for row in chunk for value in row]).fetchall())
+        written = {row[conflict] for row in returned}
+        key = columns.index(conflict)
+        unchanged = [row[key] for row in rows if row[key] not in written]
+        for chunk in chunked(unchanged, limit):
+            sql = f"SELECT id, {column_list} FROM {table} WHERE {conflict} IN ({', '.join('?' for _ in chunk)})"
+            returned.extend(cursor.execute(sql, chunk).fetchall())
+    return returned
+
+def delete_where(table, columns, filters, cascade=(), hashed=()):
+    # One DELETE per table; cascade is (child_table, foreign_key) pairs removed first.
+    # Returns {table: [deleted ids]} so callers can evict them from identity maps.
+    if not filters:
+        raise ValueError("delete_where requires at least one filter.")
+    where, params = compile_filters(columns, filters, hashed)
+    deleted = {}
+    matching = f"SELECT id FROM {table} WHERE {where}"
+    with transaction() as cursor: # The write lock is held, so the ids read here are the rows deleted
+        for child, foreign_key in cascade:
+            sql = f"SELECT id FROM {child} WHERE {foreign_key} IN ({matching})"
+            deleted[child] = [row[0] for row in cursor.execute(sql, params).fetchall()]
+            cursor.execute(f"DELETE FROM {child} WHERE {foreign_key} IN ({matching})", params)
+        deleted[table] = [row[0] for row in cursor.execute(matching, params).fetchall()]
+        cursor.execute(f"DELETE FROM {table} WHERE {where}", params)
+    from lib.db import catalog
+    for name, ids in deleted.items():
+        catalog.forget(name, ids) # Or find_by_id would still find them in the snapshot
+    return deleted
+
+def update_where(table, columns, values, filters, hashed=()):
+    # One UPDATE for every matching row; returns the updated ids.
+    # Fields in hashed may also set their {field}_hash column (see query.HASHED_OPERATORS).
+    if not values:
+        raise ValueError("update_where requires at least one value to set.")
+    if not filters:
+        raise ValueError("update_where requires at least one filter.")
+    for field in values:
+        if field == "id":
+            raise ValueError("update_where cannot change id; identity maps are keyed by it.")
+        if field not in columns and (field[:-5] if field.endswith("_hash") else field) not in hashed: # Python 3.8: no removesuffix
+            raise ValueError(f"Unknown field: {field}")
+    where, params = compile_filters(columns, filters, hashed)
+    set_clause = ", ".join(f"{field} = ?" for field in values)
+    with transaction() as cursor:
+        updated = [row[0] for row in cursor.execute(f"SELECT id FROM {table} WHERE {where}", params).fetchall()]
+        cursor.execute(f"UPDATE {table} SET {set_clause} WHERE {where}", [*values.values(), *params])
+    from lib.db import catalog
+    catalog.forget(table, updated) # Evicted from the identity map; the snapshot copy is stale too
+    return updated
+
+def evict(cache, ids, deleted=False):
+    for id in ids:
+        instance = cache.pop(id, None)
+        if deleted and instance is not None:
+            instance.id = None
+            on_rollback(lambda instance=instance, id=id: _undelete(cache, instance, id))
+
+def _undelete(cache, instance, id):
+    # The delete rolled back with an outer transaction(): the row, and so the instance, is back
+    instance.id = id
+    cache.setdefault(id, instance)
+
+JSON_IDS_THRESHOLD = 10 # Chunks beyond which ids are bound as one JSON array instead
+
+def fetch_by_ids(table, ids):
+    # WHERE id IN (?, ...) chunked under the variable limit; very large sets go
+    # through a single json_each() join rather than dozens of statements.
+    if not ids:
+        return []
+    chunk_size = max_variables()
+    with reader() as conn:
+        if len(ids) > chunk_size * JSON_IDS_THRESHOLD:
+            import json
+            sql = f"SELECT {table}.* FROM json_each(?) AS ids JOIN {table} ON {table}.id = ids.value"
+            return conn.execute(sql, (json.dumps(ids),)).fetchall()
+        rows = []
+        for chunk in chunked(ids, chunk_size):
+            sql = f"SELECT * FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})"
+            rows.extend(conn.execute(sql, chunk).fetchall())
+        return rows
+
+def find_by_ids(model, cache, ids):
+    # Identity-map hits first, one batched fetch for the misses; input order, None if missing
+    ids = list(ids)
+    found = {id: cache[id] for id in ids if id in cache}
+    missing = [id for id in dict.fromkeys(ids) if id not in found]
+    for row in fetch_by_ids(model.TABLE, missing):
+        instance = model._from_row(row)
+        cache[instance.id] = instance
+        found[instance.id] = instance
+    return [found.get(id) for id in ids]
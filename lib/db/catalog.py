@@ -0,0 +1,150 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from lib.db.connection import snapshot
+
+# Read-only catalog snapshot shared by prefork workers through mmap.
+#
+# Layout: a fixed header, then 8-byte aligned int64 sections and one UTF-8 string blob.
+# Ids are sorted so lookups are a binary search over a memoryview of the mapped file;
+# nothing is copied until a string is decoded.
+MAGIC = b"ACAT"
+VERSION = 1
+SECTIONS = (
+    "author_ids", "author_names",
+    "magazine_ids", "magazine_names", "magazine_categories",
+    "article_ids", "article_author_ids", "article_magazine_ids",
+)
+HEADER = struct.Struct("<4sII" + "QQ" * len(SECTIONS)) # magic, version, byte order, then (offset, count) per section
+BYTE_ORDER = 1 if sys.byteorder == "little" else 2
+
+_active = None
+_forgotten = {"authors": set(), "magazines": set(), "articles": set()} # Ids this process deleted or rewrote
+
+def forget(table, ids):
+    # The snapshot's copy of these rows is stale, so lookups skip it and callers read the database
+    _forgotten[table].update(ids)
+
+def build(path):
+    # Writes the catalog from one consistent read snapshot, atomically replacing path
+    with snapshot() as conn:
+        authors = conn.execute("SELECT id, name FROM authors ORDER BY id").fetchall()
+        magazines = conn.execute("SELECT id, name, category FROM magazines ORDER BY id").fetchall()
+        articles = conn.execute("SELECT id, author_id, magazine_id FROM articles ORDER BY id").fetchall()
+
+    blob = bytearray()
+    def string_offsets(values):
+        offsets = array("q", [len(blob)])
+        for value in values:
+            blob.extend(value.encode("utf-8"))
+            offsets.append(len(blob))
+        return offsets
+
+    sections = {
+        "author_ids": array("q", (row[0] for row in authors)),
+        "author_names": string_offsets(row[1] for row in authors),
+        "magazine_ids": array("q", (row[0] for row in magazines)),
+        "magazine_names": string_offsets(row[1] for row in magazines),
+        "magazine_categories": string_offsets(row[2] for row in magazines),
+        "article_ids": array("q", (row[0] for row in articles)),
+        "article_author_ids": array("q", (row[1] for row in articles)),
+        "article_magazine_ids": array("q", (row[2] for row in articles)),
+    }
+    position = HEADER.size + (-HEADER.size % 8)
+    layout = []
+    for name in SECTIONS:
+        layout.extend((position, len(sections[name])))
+        position += len(sections[name]) * 8
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER, *layout))
+        f.write(b"\0" * (-HEADER.size % 8))
+        for name in SECTIONS:
+            sections[name].tofile(f)
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return {"authors": len(authors), "magazines": len(magazines), "articles": len(articles)}
+
+class CatalogSnapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self._mmap, 0)
+        magic, version, byte_order = header[:3]
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} catalog snapshot.")
+        if byte_order != BYTE_ORDER:
+            raise ValueError(f"{path} was built on a machine with a different byte order.")
+        self._buffer = memoryview(self._mmap)
+        self._sections = {}
+        end = HEADER.size
+        for index, name in enumerate(SECTIONS):
+            offset, count = header[3 + 2 * index], header[4 + 2 * index]
+            self._sections[name] = self._buffer[offset:offset + count * 8].cast("q")
+            end = max(end, offset + count * 8)
+        self._blob = self._buffer[end:]
+
+    def _index(self, table, id):
+        ids = self._sections[f"{table[:-1]}_ids"]
+        if not isinstance(id, int) or id in _forgotten[table]:
+            return None
+        i = bisect_left(ids, id)
+        return i if i < len(ids) and ids[i] == id else None
+
+    def _string(self, section, i):
+        offsets = self._sections[section]
+        return str(self._blob[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def author(self, id):
+        # {'id', 'name'} or None
+        i = self._index("authors", id)
+        if i is None:
+            return None
+        return {"id": id, "name": self._string("author_names", i)}
+
+    def magazine(self, id):
+        # {'id', 'name', 'category'} or None
+        i = self._index("magazines", id)
+        if i is None:
+            return None
+        return {"id": id, "name": self._string("magazine_names", i), "category": self._string("magazine_categories", i)}
+
+    def article_refs(self, id):
+        # (author_id, magazine_id) or None
+        i = self._index("articles", id)
+        if i is None:
+            return None
+        return self._sections["article_author_ids"][i], self._sections["article_magazine_ids"][i]
+
+    def counts(self):
+        return {
+            "authors": len(self._sections["author_ids"]),
+            "magazines": len(self._sections["magazine_ids"]),
+            "articles": len(self._sections["article_ids"]),
+        }
+
+    def close(self):
+        for view in self._sections.values():
+            view.release()
+        self._blob.release()
+        self._buffer.release()
+        self._mmap.close()
+
+def use(path):
+    # Serve Author/Magazine.find_by_id misses from the snapshot at path; None turns it off
+    global _active
+    previous, _active = _active, (CatalogSnapshot(path) if path is not None else None)
+    if previous is not None:
+        previous.close()
+    return _active
+
+def active():
+    return _active
+
+if __name__ == "__main__":
+    print(build(sys.argv[1] if len(sys.argv) > 1 else "catalog.snapshot"))
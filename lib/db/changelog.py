@@ -0,0 +1,60 @@
+from lib.db.connection import fetch_all, fetch_one, transaction
+
+def changes_since(seq, limit=1000):
+    # Changes with a sequence number greater than seq, oldest first
+    sql = """
+        SELECT seq, entity, entity_id, op, changed_at
+        FROM changelog
+        WHERE seq > ?
+        ORDER BY seq
+        LIMIT ?
+    """
+    return fetch_all(sql, (seq, limit))
+
+def latest_seq():
+    row = fetch_one("SELECT MAX(seq) FROM changelog")
+    return row[0] or 0
+
+def prune():
+    # Drop entries every registered consumer has already checkpointed past
+    with transaction() as cursor:
+        cursor.execute("""
+            DELETE FROM changelog
+            WHERE seq <= (SELECT MIN(seq) FROM changelog_checkpoints)
+        """)
+        return cursor.rowcount
+
+class ChangeConsumer:
+    # A named downstream job (search index, cache, warehouse) with a stored checkpoint
+    def __init__(self, name):
+        if not isinstance(name, str) or len(name) == 0:
+            raise ValueError("Consumer name must be a non-empty string.")
+        self.name = name
+
+    @property
+    def position(self):
+        row = fetch_one("SELECT seq FROM changelog_checkpoints WHERE consumer = ?", (self.name,))
+        return row['seq'] if row else 0
+
+    def poll(self, limit=1000):
+        return changes_since(self.position, limit)
+
+    def commit(self, seq):
+        # Checkpoints only move forward
+        sql = """
+            INSERT INTO changelog_checkpoints (consumer, seq) VALUES (?, ?)
+            ON CONFLICT (consumer) DO UPDATE SET seq = MAX(seq, excluded.seq)
+        """
+        with transaction() as cursor:
+            cursor.execute(sql, (self.name, seq))
+
+    def process(self, handler, limit=1000):
+        # Hands one batch to handler and checkpoints it once handler returns; returns the batch size
+        changes = self.poll(limit)
+        if changes:
+            handler(changes)
+            self.commit(changes[-1]['seq'])
+        return len(changes)
+
+    def __repr__(self):
+        return f"<ChangeConsumer Name: {self.name}, Position: {self.position}>"
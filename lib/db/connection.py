@@ -1,6 +1,282 @@
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DATABASE = 'articles.db'
+READER_POOL_SIZE = 4
+
+# Nothing is opened at import time; connections are created on first use and
+# re-created in a child process after fork(), where inherited handles are unsafe.
+_pid = os.getpid()
+_writer = None
+_write_lock = threading.RLock()
+_readers = [] # Idle reader connections; list.pop()/append() are atomic
+_local = threading.local()
+_stats = {"transactions": 0, "lock_wait_seconds": 0.0, "retries": 0, "retry_wait_seconds": 0.0, "busy_failures": 0}
+
+class ConcurrencyPolicy:
+    # How this process behaves when another process holds the database write lock.
+    def __init__(self, busy_timeout_ms=5000, immediate=True, max_retries=5, backoff_base_ms=10, backoff_max_ms=1000):
+        self.busy_timeout_ms = busy_timeout_ms # SQLite's own wait inside each statement
+        self.immediate = immediate # BEGIN IMMEDIATE takes the write lock up front, so no upgrade deadlocks
+        self.max_retries = max_retries
+        self.backoff_base_ms = backoff_base_ms
+        self.backoff_max_ms = backoff_max_ms
+
+    def backoff(self, attempt):
+        # Full jitter: uniform in [0, min(max, base * 2**attempt)] seconds, so retrying writers spread out
+        import random # Only needed once a write is contended; keep it off the import path
+        return random.uniform(0, min(self.backoff_max_ms, self.backoff_base_ms * 2 ** attempt)) / 1000.0
+
+    def __repr__(self):
+        return (f"<ConcurrencyPolicy busy_timeout_ms={self.busy_timeout_ms} immediate={self.immediate} "
+                f"max_retries={self.max_retries}>")
+
+_policy = ConcurrencyPolicy()
+
+def configure(**options):
+    # configure(busy_timeout_ms=..., max_retries=...) replaces the policy and applies it to open connections
+    global _policy
+    _policy = ConcurrencyPolicy(**options)
+    with _write_lock:
+        if _writer is not None:
+            _writer.execute(f"PRAGMA busy_timeout = {int(_policy.busy_timeout_ms)}")
+    for conn in list(_readers):
+        conn.execute(f"PRAGMA busy_timeout = {int(_policy.busy_timeout_ms)}")
+    return _policy
+
+def policy():
+    return _policy
+
+def is_busy(error):
+    # SQLITE_BUSY (5) / SQLITE_LOCKED (6), i.e. "database is locked"
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (5, 6)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+def retry(fn, *args):
+    # Calls fn until it stops failing with "database is locked", backing off between attempts.
+    # Only for idempotent work, e.g. a whole transaction() block, which rolls back on failure.
+    attempt = 0
+    while True:
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt >= _policy.max_retries:
+                if is_busy(e):
+                    _stats["busy_failures"] += 1
+                raise
+            delay = _policy.backoff(attempt)
+            _stats["retries"] += 1
+            _stats["retry_wait_seconds"] += delay
+            time.sleep(delay)
+            attempt += 1
 
 def get_connection():
-    conn = sqlite3.connect('articles.db')
+    conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row  # This allows us to access columns by name
-    return conn
\ No newline at end of file
+    return conn
+
+def _check_pid():
+    # Drop (never close or reuse) connections inherited from the parent process.
+    global _pid, _writer, _write_lock, _readers, _local
+    if os.getpid() != _pid:
+        _pid = os.getpid()
+        _writer = None
+        _write_lock = threading.RLock()
+        _readers = [] # Idle reader connections; list.pop()/append() are atomic
+        _local = threading.local()
+        reset_stats()
+
+def get_writer():
+    # The single connection used by save()/delete(). Guard it with transaction().
+    global _writer
+    _check_pid()
+    if _writer is None:
+        with _write_lock:
+            if _writer is None:
+                # Autocommit mode: transaction() issues BEGIN/COMMIT itself
+                conn = sqlite3.connect(DATABASE, check_same_thread=False, isolation_level=None)
+                conn.row_factory = sqlite3.Row
+                conn.execute(f"PRAGMA busy_timeout = {int(_policy.busy_timeout_ms)}")
+                conn.execute("PRAGMA journal_mode=WAL")
+                _writer = conn
+    return _writer
+
+def _open_reader():
+    conn = sqlite3.connect(DATABASE, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(_policy.busy_timeout_ms)}")
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+def max_variables():
+    # Bound parameters allowed per statement; 999 is the historical SQLite default.
+    # Asked of a reader, so bulk reads never open (or wait on) the writer connection.
+    with reader() as conn:
+        if hasattr(conn, 'getlimit'):
+            return conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return 999
+
+@contextmanager
+def transaction():
+    # Serializes writers on the shared connection and commits once on success.
+    # BEGIN and COMMIT are retried under the ConcurrencyPolicy when another process holds the lock.
+    _check_pid()
+    started = time.perf_counter()
+    with _write_lock:
+        _stats["lock_wait_seconds"] += time.perf_counter() - started
+        conn = get_writer()
+        cursor = conn.cursor()
+        if conn.in_transaction: # Nested on this thread: join the outer transaction
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            return
+        _stats["transactions"] += 1
+        try:
+            retry(conn.execute, "BEGIN IMMEDIATE" if _policy.immediate else "BEGIN")
+        except BaseException:
+            cursor.close()
+            raise
+        _local.holding = getattr(_local, 'holding', 0) + 1 # Only once BEGIN succeeded; the finally below undoes it
+        _local.writing = True # reader() on this thread now goes to the writer, to see these writes
+        _local.rollback_hooks, _local.commit_hooks = [], []
+        try:
+            yield cursor
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            _run_rollback_hooks()
+            raise
+        else:
+            try:
+                retry(conn.execute, "COMMIT") # A busy COMMIT leaves the transaction open, so it can be retried
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                _run_rollback_hooks()
+                raise
+        finally:
+            _local.writing = False
+            _local.holding -= 1
+            cursor.close()
+        hooks, _local.commit_hooks = _local.commit_hooks, []
+        for hook in hooks:
+            hook()
+
+def on_rollback(fn):
+    # Calls fn if the enclosing transaction() rolls back, e.g. to evict objects cached for
+    # writes made inside it. Outside a transaction the write has already committed: no-op.
+    if in_write_transaction():
+        _local.rollback_hooks.append(fn)
+
+def after_commit(fn):
+    # Calls fn once the enclosing transaction() commits (now, outside one), for caches other
+    # threads read, which must never show writes that could still roll back
+    if in_write_transaction():
+        _local.commit_hooks.append(fn)
+    else:
+        fn()
+
+def _run_rollback_hooks():
+    hooks, _local.rollback_hooks, _local.commit_hooks = _local.rollback_hooks, [], []
+    for hook in reversed(hooks):
+        hook()
+
+@contextmanager
+def exclusive():
+    # The writer connection outside any transaction, for VACUUM and WAL checkpoints
+    _check_pid()
+    if in_write_transaction(): # executescript() and VACUUM would commit the caller's transaction
+        raise RuntimeError("exclusive() cannot be used inside transaction(); commit first.")
+    with _write_lock:
+        _local.holding = getattr(_local, 'holding', 0) + 1
+        try:
+            yield get_writer()
+        finally:
+            _local.holding -= 1
+
+@contextmanager
+def reader():
+    # Inside transaction() reads use the writer, so the thread sees its own uncommitted
+    # writes; inside snapshot() every read goes to the same pinned connection.
+    _check_pid()
+    if in_write_transaction():
+        yield _writer
+        return
+    pinned = getattr(_local, 'snapshot', None)
+    if pinned is not None:
+        yield pinned
+        return
+    try:
+        conn = _readers.pop()
+    except IndexError:
+        conn = _open_reader()
+    try:
+        yield conn
+    finally:
+        if len(_readers) < READER_POOL_SIZE:
+            _readers.append(conn)
+        else:
+            conn.close()
+
+@contextmanager
+def snapshot():
+    # A consistent WAL read snapshot for several queries, e.g. authors() and article_titles().
+    if getattr(_local, 'snapshot', None) is not None:
+        yield _local.snapshot
+        return
+    if in_write_transaction(): # The open write transaction is already a consistent view
+        yield _writer
+        return
+    with reader() as conn:
+        conn.execute("BEGIN")
+        # WAL pins the snapshot on the first read, not on BEGIN.
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        _local.snapshot = conn
+        try:
+            yield conn
+        finally:
+            _local.snapshot = None
+            conn.execute("COMMIT")
+
+def stats():
+    # Copy of the counters. lock_wait_seconds is time queued behind other writer threads;
+    # retries/retry_wait_seconds count backoffs after "database is locked"; busy_failures gave up.
+    return dict(_stats)
+
+def reset_stats():
+    _stats.update(transactions=0, lock_wait_seconds=0.0, retries=0, retry_wait_seconds=0.0, busy_failures=0)
+
+def holds_writer():
+    # True while this thread is inside transaction() or exclusive(), i.e. owns the writer lock
+    return getattr(_local, 'holding', 0) > 0
+
+def in_write_transaction():
+    # True on the thread that has an open transaction(); it holds the writer lock
+    return getattr(_local, 'writing', False)
+
+def in_snapshot():
+    return getattr(_local, 'snapshot', None) is not None
+
+def fetch_one(sql, params=()):
+    with reader() as conn:
+        return retry(lambda: conn.execute(sql, params).fetchone())
+
+def fetch_all(sql, params=()):
+    with reader() as conn:
+        return retry(lambda: conn.execute(sql, params).fetchall())
+
+def close_all():
+    global _writer
+    with _write_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+    while _readers:
+        _readers.pop().close()
@@ -0,0 +1,220 @@
+import threading
+import time
+from lib.db import connection
+from lib.db.connection import exclusive, fetch_all, fetch_one, transaction
+from lib.db.changelog import latest_seq
+
+# Planner statistics, freelist reclaim and WAL checkpoints. run() is the one-shot
+# version used by scripts/maintain.py; MaintenanceScheduler repeats the cheap parts
+# in a background thread and only analyzes after enough rows have changed.
+CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+MIN_AUTOCHECKPOINT = 1000 # SQLite's default, in WAL pages
+MAX_AUTOCHECKPOINT = 20000
+CHECKPOINT_TARGET_SECONDS = 30 # Aim to checkpoint about this often at the observed write rate
+
+# Queries the models run on every page; their plans and latency are compared before/after
+PROBE_QUERIES = {
+    "magazine.authors": """
+        SELECT DISTINCT authors.* FROM authors
+        JOIN articles ON authors.id = articles.author_id
+        WHERE articles.magazine_id = (SELECT MIN(id) FROM magazines)
+    """,
+    "author.magazines": """
+        SELECT DISTINCT magazines.* FROM magazines
+        JOIN articles ON magazines.id = articles.magazine_id
+        WHERE articles.author_id = (SELECT MIN(id) FROM authors)
+    """,
+    "magazine.contributing_authors": """
+        SELECT authors.id, authors.name, COUNT(articles.id) AS article_count
+        FROM authors JOIN articles ON authors.id = articles.author_id
+        WHERE articles.magazine_id = (SELECT MIN(id) FROM magazines)
+        GROUP BY authors.id, authors.name
+        HAVING COUNT(articles.id) >= 3
+    """,
+}
+
+def page_stats():
+    row = fetch_one("""
+        SELECT page_count, freelist_count, page_size, auto_vacuum
+        FROM pragma_page_count, pragma_freelist_count, pragma_page_size, pragma_auto_vacuum
+    """)
+    return {
+        "page_count": row['page_count'], "freelist_count": row['freelist_count'],
+        "page_size": row['page_size'], "auto_vacuum": ("none", "full", "incremental")[row['auto_vacuum']],
+    }
+
+def query_plan(sql):
+    return [row['detail'] for row in fetch_all(f"EXPLAIN QUERY PLAN {sql}")]
+
+def query_latency(sql, repeat=20):
+    # Best of `repeat` runs, in milliseconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fetch_all(sql)
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+def probe():
+    return {
+        name: {"plan": query_plan(sql), "latency_ms": query_latency(sql)}
+        for name, sql in PROBE_QUERIES.items()
+    }
+
+def optimize(full=False):
+    # PRAGMA optimize re-analyzes only tables whose stats look stale; full=True runs ANALYZE on everything
+    with transaction() as cursor:
+        if full:
+            cursor.execute("ANALYZE")
+        else:
+            cursor.execute("PRAGMA analysis_limit = 1000") # Sampled, so it stays cheap on big tables
+            cursor.execute("PRAGMA optimize")
+
+def incremental_vacuum(max_pages=None):
+    # Returns freelist pages handed back to the OS; a no-op unless auto_vacuum is INCREMENTAL
+    before = page_stats()["freelist_count"]
+    with exclusive() as conn:
+        sql = "PRAGMA incremental_vacuum" if max_pages is None else f"PRAGMA incremental_vacuum({int(max_pages)})"
+        conn.executescript(sql) # execute() steps once, and each step frees only one page
+    return before - page_stats()["freelist_count"]
+
+def enable_incremental_vacuum():
+    # Databases created before schema.sql set auto_vacuum need one full VACUUM to switch modes
+    if page_stats()["auto_vacuum"] == "incremental":
+        return False
+    with exclusive() as conn:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
+
+def checkpoint(mode="PASSIVE"):
+    # {'busy', 'wal_pages', 'checkpointed'}; TRUNCATE also shrinks the -wal file to zero bytes
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"mode must be one of {CHECKPOINT_MODES}.")
+    with exclusive() as conn:
+        busy, wal_pages, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"busy": bool(busy), "wal_pages": wal_pages, "checkpointed": checkpointed}
+
+def wal_restarts():
+    # Checkpoint sequence number from the -wal header. SQLite bumps it each time a writer
+    # restarts the log from the top after a complete checkpoint; None while there is no log.
+    try:
+        with open(connection.DATABASE + "-wal", "rb") as f:
+            header = f.read(16)
+    except FileNotFoundError:
+        return None
+    return int.from_bytes(header[12:16], "big") if len(header) == 16 else None
+
+def pages_written(before, after, autocheckpoint):
+    # WAL frames appended between two (wal_restarts(), checkpoint()) readings. Without a restart
+    # in between that is how much the log grew. A restart means the log was emptied and began
+    # again: at once if the earlier checkpoint had copied every frame, otherwise once it reached
+    # wal_autocheckpoint pages, the size every later restart in the interval happened at too.
+    (restarts_before, wal_before), (restarts_after, wal_after) = before, after
+    if restarts_after is None:
+        return 0 # Truncated and not written to since
+    if restarts_before is None:
+        return wal_after["wal_pages"]
+    restarts = restarts_after - restarts_before
+    if restarts == 0:
+        return max(wal_after["wal_pages"] - wal_before["wal_pages"], 0)
+    complete = not wal_before["busy"] and wal_before["checkpointed"] == wal_before["wal_pages"]
+    first = 0 if complete else max(autocheckpoint - wal_before["wal_pages"], 0)
+    return first + (restarts - 1) * autocheckpoint + wal_after["wal_pages"]
+
+def autocheckpoint_pages(pages_per_second, target_seconds=CHECKPOINT_TARGET_SECONDS):
+    # WAL size at which writers checkpoint automatically: about target_seconds of writes
+    return max(MIN_AUTOCHECKPOINT, min(MAX_AUTOCHECKPOINT, int(pages_per_second * target_seconds)))
+
+def set_autocheckpoint(pages):
+    with exclusive() as conn:
+        conn.execute(f"PRAGMA wal_autocheckpoint = {int(pages)}")
+    return pages
+
+def run(full_analyze=False, vacuum=True, checkpoint_mode="TRUNCATE"):
+    # One maintenance pass with a before/after report
+    before_pages, before_probe = page_stats(), probe()
+    started = time.perf_counter()
+    optimize(full_analyze)
+    reclaimed = incremental_vacuum() if vacuum else 0
+    wal = checkpoint(checkpoint_mode)
+    elapsed = time.perf_counter() - started
+    after_pages = page_stats()
+    return {
+        "pages_before": before_pages,
+        "pages_after": after_pages,
+        "reclaimed_pages": reclaimed,
+        "reclaimed_bytes": reclaimed * after_pages["page_size"],
+        "checkpoint": wal,
+        "maintenance_seconds": round(elapsed, 3),
+        "queries": {
+            name: {"before": before, "after": probe_after}
+            for (name, before), probe_after in zip(before_probe.items(), probe().values())
+        },
+    }
+
+class MaintenanceScheduler:
+    # Background maintenance for long-running processes. Every interval it checkpoints,
+    # retunes wal_autocheckpoint to the write rate and reclaims free pages; it only
+    # re-analyzes once change_threshold rows have changed (counted from the changelog).
+    def __init__(self, interval_seconds=300, change_threshold=1000, vacuum_threshold_pages=256):
+        self.interval_seconds = interval_seconds
+        self.change_threshold = change_threshold
+        self.vacuum_threshold_pages = vacuum_threshold_pages
+        self.last_report = None
+        self._analyzed_seq = latest_seq()
+        self._last_run = time.monotonic()
+        self._wal_mark = None # (wal_restarts(), checkpoint()) as the last run left the log
+        self._autocheckpoint = MIN_AUTOCHECKPOINT
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        now = time.monotonic()
+        elapsed, self._last_run = max(now - self._last_run, 1e-3), now
+        report = {"analyzed": False, "reclaimed_pages": 0}
+        seq = latest_seq()
+        if seq - self._analyzed_seq >= self.change_threshold:
+            optimize()
+            self._analyzed_seq = seq
+            report["analyzed"] = True
+        if page_stats()["freelist_count"] >= self.vacuum_threshold_pages:
+            report["reclaimed_pages"] = incremental_vacuum()
+        wal = checkpoint("PASSIVE")
+        mark = (wal_restarts(), wal)
+        # The WAL's size is not a rate: it is whatever has not been reset yet. Count the pages
+        # actually written since the last run instead (the first run only sees the current log).
+        written = pages_written(self._wal_mark, mark, self._autocheckpoint) if self._wal_mark else wal["wal_pages"]
+        report["checkpoint"] = wal
+        report["pages_written"] = written
+        self._autocheckpoint = set_autocheckpoint(autocheckpoint_pages(written / elapsed))
+        report["wal_autocheckpoint"] = self._autocheckpoint
+        if not wal["busy"] and wal["wal_pages"] > MAX_AUTOCHECKPOINT:
+            report["checkpoint"] = checkpoint("TRUNCATE") # Readers let go: shrink the file too
+            mark = (wal_restarts(), report["checkpoint"])
+        self._wal_mark = mark
+        self.last_report = report
+        return report
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e: # Busy or locked this round; try again next interval
+                self.last_report = {"error": str(e)}
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __repr__(self):
+        return f"<MaintenanceScheduler every {self.interval_seconds}s, analyze after {self.change_threshold} changes>"
@@ -0,0 +1,199 @@
+from lib.db.connection import reader
+
+OPERATORS = {
+    'exact': '{} = ?',
+    'isnull': '{} IS NULL',
+    'ne': '{} != ?',
+    'lt': '{} < ?',
+    'lte': '{} <= ?',
+    'gt': '{} > ?',
+    'gte': '{} >= ?',
+    # One bound JSON array, so the SQL text is the same for any list length
+    'in': '{} IN (SELECT value FROM json_each(?))',
+}
+
+# Lookups on fields that may instead be stored by hash in {field}_hash (Article.content in
+# content_blobs). The value is hashed and matched against both columns; comparisons other
+# than equality cannot be answered without decompressing, so they are rejected.
+HASHED_OPERATORS = {
+    'exact': '({0} = ? OR {0}_hash = ?)',
+    'ne': 'COALESCE({0} != ?, {0}_hash != ?)',
+    'in': '({0} IN (SELECT value FROM json_each(?)) OR {0}_hash IN (SELECT value FROM json_each(?)))',
+    'isnull': '({0} IS NULL AND {0}_hash IS NULL)',
+}
+
+MAX_COMPILED = 256
+_compiled = {}
+
+def parse_filter(columns, key, hashed=()):
+    field, _, op = key.partition('__')
+    op = op or 'exact'
+    if field not in columns:
+        raise ValueError(f"Unknown field: {field}")
+    if op not in OPERATORS or op == 'isnull':
+        raise ValueError(f"Unknown lookup: {op}")
+    if field in hashed and op not in HASHED_OPERATORS:
+        raise ValueError(f"{field}__{op} is not supported: {field} may be stored compressed, by hash.")
+    return field, op
+
+def filter_shape(columns, filters, hashed=()):
+    # The parts of a filter set that change the SQL text, in a canonical order
+    shape = []
+    for key in sorted(filters):
+        field, op = parse_filter(columns, key, hashed)
+        if op == 'exact' and filters[key] is None:
+            op = 'isnull'
+        shape.append((key, field, op, field in hashed))
+    return tuple(shape)
+
+def where_sql(shape):
+    return " AND ".join(
+        (HASHED_OPERATORS if by_hash else OPERATORS)[op].format(field) for _, field, op, by_hash in shape
+    ) or "1"
+
+def filter_params(shape, filters):
+    params = []
+    for key, _, op, by_hash in shape:
+        if op == 'isnull':
+            continue
+        values = list(filters[key]) if op == 'in' else [filters[key]]
+        groups = [values]
+        if by_hash:
+            from lib.db.blobs import digest # Only needed for lookups on hashed fields
+            groups.append([digest(value) for value in values])
+        for group in groups:
+            if op == 'in':
+                import json # Only needed for __in lookups
+                params.append(json.dumps(group))
+            else:
+                params.append(group[0])
+    return params
+
+def compile_filters(columns, filters, hashed=()):
+    # Django-style keyword filters, e.g. author_id=3, magazine_id__in=[1, 2]
+    shape = filter_shape(columns, filters, hashed)
+    return where_sql(shape), filter_params(shape, filters)
+
+def compiled_count():
+    return len(_compiled)
+
+class Query:
+    # Immutable, chainable query over one model, e.g.
+    # Article.where(author_id=3, magazine_id__in=[1, 2]).order_by("id").limit(100)
+    def __init__(self, model, filters=None, ordering=(), limit=None, offset=None):
+        self.model = model
+        self._filters = dict(filters or {})
+        self._ordering = tuple(ordering)
+        self._limit = limit
+        self._offset = offset
+
+    def _clone(self, **changes):
+        state = dict(filters=self._filters, ordering=self._ordering, limit=self._limit, offset=self._offset)
+        state.update(changes)
+        return Query(self.model, **state)
+
+    def where(self, **filters):
+        filter_shape(self.model.COLUMNS, filters, self.model.HASHED_FIELDS) # Fail on unknown fields now, not at execution
+        return self._clone(filters={**self._filters, **filters})
+
+    def order_by(self, *fields):
+        for field in fields:
+            if field.lstrip('-') not in self.model.COLUMNS:
+                raise ValueError(f"Unknown field: {field.lstrip('-')}")
+        return self._clone(ordering=fields)
+
+    def limit(self, count):
+        if not isinstance(count, int) or count < 0:
+            raise ValueError("limit must be a non-negative integer.")
+        return self._clone(limit=count)
+
+    def offset(self, count):
+        if not isinstance(count, int) or count < 0:
+            raise ValueError("offset must be a non-negative integer.")
+        return self._clone(offset=count)
+
+    def _statement(self, mode, fields=()):
+        shape = filter_shape(self.model.COLUMNS, self._filters, self.model.HASHED_FIELDS)
+        key = (self.model.TABLE, mode, fields, shape, self._ordering, self._limit is not None, self._offset is not None)
+        sql = _compiled.get(key)
+        if sql is None:
+            sql = self._compile(mode, fields, shape)
+            if len(_compiled) >= MAX_COMPILED:
+                _compiled.clear()
+            _compiled[key] = sql
+        params = filter_params(shape, self._filters)
+        if self._limit is not None or self._offset is not None:
+            params.append(-1 if self._limit is None else self._limit)
+        if self._offset is not None:
+            params.append(self._offset)
+        return sql, params
+
+    def _compile(self, mode, fields, shape):
+        columns = ", ".join(fields) if fields else "*"
+        sql = f"SELECT {columns} FROM {self.model.TABLE} WHERE {where_sql(shape)}"
+        if self._ordering and mode in ('select', 'values'):
+            sql += " ORDER BY " + ", ".join(
+                f"{field[1:]} DESC" if field.startswith('-') else field for field in self._ordering
+            )
+        if self._limit is not None or self._offset is not None:
+            sql += " LIMIT ?"
+        if self._offset is not None:
+            sql += " OFFSET ?"
+        if mode == 'count':
+            return f"SELECT COUNT(*) FROM ({sql})"
+        if mode == 'exists':
+            return f"SELECT EXISTS ({sql})"
+        return sql
+
+    def iter(self):
+        # Streams rows from the cursor, building one instance at a time
+        sql, params = self._statement('select')
+        with reader() as conn:
+            for row in conn.execute(sql, params):
+                yield self.model._from_row(row)
+
+    def __iter__(self):
+        return self.iter()
+
+    def all(self):
+        return list(self.iter())
+
+    def first(self):
+        for instance in self.limit(1).iter():
+            return instance
+        return None
+
+    def values(self, *fields):
+        # Plain tuples of the requested columns; no model instances are built
+        for field in fields:
+            if field not in self.model.COLUMNS:
+                raise ValueError(f"Unknown field: {field}")
+        fields = fields or self.model.COLUMNS
+        hashed = [field for field in fields if field in self.model.HASHED_FIELDS]
+        sql, params = self._statement('values', fields + tuple(f"{field}_hash" for field in hashed))
+        with reader() as conn:
+            rows = [tuple(row) for row in conn.execute(sql, params)]
+        if not hashed:
+            return rows
+        # Bodies stored in content_blobs come back as NULL plus a hash; decode them in place
+        from lib.db.blobs import load
+        width = len(fields)
+        positions = [(fields.index(field), width + i) for i, field in enumerate(hashed)]
+        decoded = []
+        for row in rows:
+            values = list(row[:width])
+            for position, digest_at in positions:
+                if values[position] is None and row[digest_at] is not None:
+                    values[position] = load(row[digest_at])
+            decoded.append(tuple(values))
+        return decoded
+
+    def count(self):
+        sql, params = self._statement('count', ('1',))
+        with reader() as conn:
+            return conn.execute(sql, params).fetchone()[0]
+
+    def exists(self):
+        sql, params = self._statement('exists', ('1',))
+        with reader() as conn:
+            return bool(conn.execute(sql, params).fetchone()[0])
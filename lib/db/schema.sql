@@ -1,5 +1,16 @@
 -- This file contains the SQL schema for the database.
+-- Freed pages go on a freelist that lib/db/maintenance.py returns to the OS in steps.
+-- Only takes effect on a new database; maintenance.enable_incremental_vacuum() converts an old one.
+PRAGMA auto_vacuum = INCREMENTAL;
+DROP TABLE IF EXISTS author_similarity;
+DROP TABLE IF EXISTS magazine_similarity;
+DROP TABLE IF EXISTS author_category_weights;
+DROP TABLE IF EXISTS magazine_activity;
+DROP TABLE IF EXISTS changelog;
+DROP TABLE IF EXISTS changelog_checkpoints;
 DROP TABLE IF EXISTS articles;
+DROP TABLE IF EXISTS content_blobs;
+DROP TABLE IF EXISTS content_moves;
 DROP TABLE IF EXISTS authors;
 DROP TABLE IF EXISTS magazines;
 
@@ -8,19 +19,184 @@ CREATE TABLE IF NOT EXISTS authors (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL
 );
+-- Names are natural keys: get_or_create/upsert_many conflict on them
+CREATE UNIQUE INDEX IF NOT EXISTS idx_authors_name ON authors(name);
 -- Create the magazines table
 CREATE TABLE IF NOT EXISTS magazines (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
     category TEXT NOT NULL
 );
+CREATE UNIQUE INDEX IF NOT EXISTS idx_magazines_name ON magazines(name);
 -- Create the articles table
 CREATE TABLE IF NOT EXISTS articles (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     title TEXT NOT NULL,
-    content TEXT NOT NULL, 
+    content TEXT, -- NULL when the body lives in content_blobs
     author_id INTEGER NOT NULL,
     magazine_id INTEGER NOT NULL,
+    content_hash TEXT,
     FOREIGN KEY (author_id) REFERENCES authors(id),
-    FOREIGN KEY (magazine_id) REFERENCES magazines(id)
-);
\ No newline at end of file
+    FOREIGN KEY (magazine_id) REFERENCES magazines(id),
+    FOREIGN KEY (content_hash) REFERENCES content_blobs(hash),
+    CHECK (content IS NOT NULL OR content_hash IS NOT NULL)
+);
+-- Deduplicated, compressed article bodies keyed by SHA-256 (lib/db/blobs.py)
+CREATE TABLE IF NOT EXISTS content_blobs (
+    hash TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    body BLOB NOT NULL
+) WITHOUT ROWID;
+-- Bodies blobs.migrate() is moving into content_blobs, with the hash it computed from the
+-- inline text. SQLite has no SHA-256 of its own, so this is how the changelog trigger tells
+-- a storage-only move from an edit. Filled and emptied inside migrate()'s transaction.
+CREATE TABLE IF NOT EXISTS content_moves (
+    article_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+-- Foreign key lookups: relationship methods and cascading deletes
+CREATE INDEX IF NOT EXISTS idx_articles_author_magazine ON articles(author_id, magazine_id);
+-- Covers Magazine.article_titles(): titles in id order without touching the table
+CREATE INDEX IF NOT EXISTS idx_articles_magazine_titles ON articles(magazine_id, id, title);
+
+-- Top-k neighbours written by lib/analytics/similarity.py; read back with one indexed range scan
+CREATE TABLE IF NOT EXISTS author_similarity (
+    author_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    similar_author_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (author_id, rank)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS magazine_similarity (
+    magazine_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    similar_magazine_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (magazine_id, rank)
+) WITHOUT ROWID;
+
+-- Recommendation index: per-author article counts by category and per-magazine activity,
+-- kept current by the triggers below so lookups never rescan articles
+CREATE TABLE IF NOT EXISTS author_category_weights (
+    author_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (author_id, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS magazine_activity (
+    magazine_id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    article_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_magazine_activity_category ON magazine_activity(category, article_count DESC);
+
+CREATE TRIGGER IF NOT EXISTS trg_magazines_activity_insert AFTER INSERT ON magazines
+BEGIN
+    INSERT OR IGNORE INTO magazine_activity (magazine_id, category) VALUES (NEW.id, NEW.category);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_magazines_activity_delete AFTER DELETE ON magazines
+BEGIN
+    DELETE FROM magazine_activity WHERE magazine_id = OLD.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_magazines_activity_category AFTER UPDATE OF category ON magazines
+WHEN OLD.category != NEW.category
+BEGIN
+    UPDATE magazine_activity SET category = NEW.category WHERE magazine_id = NEW.id;
+    UPDATE author_category_weights
+    SET weight = weight - (
+        SELECT COUNT(*) FROM articles
+        WHERE articles.author_id = author_category_weights.author_id AND articles.magazine_id = NEW.id
+    )
+    WHERE category = OLD.category
+      AND author_id IN (SELECT author_id FROM articles WHERE magazine_id = NEW.id);
+    INSERT INTO author_category_weights (author_id, category, weight)
+    SELECT author_id, NEW.category, COUNT(*) FROM articles WHERE magazine_id = NEW.id GROUP BY author_id
+    ON CONFLICT (author_id, category) DO UPDATE SET weight = weight + excluded.weight;
+    DELETE FROM author_category_weights WHERE category = OLD.category AND weight <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_articles_recommend_insert AFTER INSERT ON articles
+BEGIN
+    INSERT INTO author_category_weights (author_id, category, weight)
+    SELECT NEW.author_id, category, 1 FROM magazines WHERE id = NEW.magazine_id
+    ON CONFLICT (author_id, category) DO UPDATE SET weight = weight + 1;
+    UPDATE magazine_activity SET article_count = article_count + 1 WHERE magazine_id = NEW.magazine_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_articles_recommend_delete AFTER DELETE ON articles
+BEGIN
+    UPDATE author_category_weights SET weight = weight - 1
+    WHERE author_id = OLD.author_id
+      AND category = (SELECT category FROM magazines WHERE id = OLD.magazine_id);
+    DELETE FROM author_category_weights WHERE author_id = OLD.author_id AND weight <= 0;
+    UPDATE magazine_activity SET article_count = article_count - 1 WHERE magazine_id = OLD.magazine_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_articles_recommend_update AFTER UPDATE OF author_id, magazine_id ON articles
+WHEN OLD.author_id != NEW.author_id OR OLD.magazine_id != NEW.magazine_id
+BEGIN
+    UPDATE author_category_weights SET weight = weight - 1
+    WHERE author_id = OLD.author_id
+      AND category = (SELECT category FROM magazines WHERE id = OLD.magazine_id);
+    DELETE FROM author_category_weights WHERE author_id = OLD.author_id AND weight <= 0;
+    UPDATE magazine_activity SET article_count = article_count - 1 WHERE magazine_id = OLD.magazine_id;
+    INSERT INTO author_category_weights (author_id, category, weight)
+    SELECT NEW.author_id, category, 1 FROM magazines WHERE id = NEW.magazine_id
+    ON CONFLICT (author_id, category) DO UPDATE SET weight = weight + 1;
+    UPDATE magazine_activity SET article_count = article_count + 1 WHERE magazine_id = NEW.magazine_id;
+END;
+
+-- Change-data-capture log: one row per insert/update/delete, filled by triggers so every
+-- write path is covered. AUTOINCREMENT keeps seq strictly increasing and never reused.
+-- Updates are logged only when a column actually changes, so no-op rewrites stay quiet.
+CREATE TABLE IF NOT EXISTS changelog (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,
+    entity_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    changed_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0) -- Unix seconds
+);
+CREATE TABLE IF NOT EXISTS changelog_checkpoints (
+    consumer TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS trg_authors_changelog_insert AFTER INSERT ON authors
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('author', NEW.id, 'insert');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_authors_changelog_update AFTER UPDATE ON authors
+WHEN OLD.name IS NOT NEW.name
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('author', NEW.id, 'update');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_authors_changelog_delete AFTER DELETE ON authors
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('author', OLD.id, 'delete');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_magazines_changelog_insert AFTER INSERT ON magazines
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('magazine', NEW.id, 'insert');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_magazines_changelog_update AFTER UPDATE ON magazines
+WHEN OLD.name IS NOT NEW.name OR OLD.category IS NOT NEW.category
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('magazine', NEW.id, 'update');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_magazines_changelog_delete AFTER DELETE ON magazines
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('magazine', OLD.id, 'delete');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_articles_changelog_insert AFTER INSERT ON articles
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('article', NEW.id, 'insert');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_articles_changelog_update AFTER UPDATE ON articles
+WHEN OLD.title IS NOT NEW.title OR OLD.author_id IS NOT NEW.author_id OR OLD.magazine_id IS NOT NEW.magazine_id
+    OR ((OLD.content IS NOT NEW.content OR OLD.content_hash IS NOT NEW.content_hash)
+        AND NOT (OLD.content IS NOT NULL AND NEW.content IS NULL -- Same text, now stored by hash
+                 AND EXISTS (SELECT 1 FROM content_moves WHERE article_id = NEW.id AND content_hash = NEW.content_hash)))
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('article', NEW.id, 'update');
+END;
+CREATE TRIGGER IF NOT EXISTS trg_articles_changelog_delete AFTER DELETE ON articles
+BEGIN
+    INSERT INTO changelog (entity, entity_id, op) VALUES ('article', OLD.id, 'delete');
+END;
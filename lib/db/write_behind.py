@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from lib.db.connection import holds_writer, retry, transaction
+
+_STOP = object()
+
+class WriteBehindQueue:
+    # Batches queued writes into one transaction per batch_size rows or flush_interval_ms.
+    # Each submit() returns a Future that resolves to the statement's lastrowid after commit.
+    def __init__(self, batch_size=500, flush_interval_ms=50, max_pending=10000):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be a positive integer.")
+        if max_pending <= 0:
+            raise ValueError("max_pending must be a positive integer.")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+        self._closed = False
+        self._start()
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_pending) # put() blocks when full: backpressure
+        self._thread = threading.Thread(target=self._run, name="article-write-behind", daemon=True)
+        self._thread.start()
+
+    def _check_pid(self):
+        # A forked child inherits the queue but not its thread: start a fresh, empty one.
+        # Writes queued before fork() belong to the parent, which still commits them.
+        if os.getpid() != self._pid and not self._closed:
+            self._start()
+
+    def submit(self, sql, params=(), before=()):
+        # before: (sql, params) statements committed in the same transaction, ahead of this one
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed.")
+        self._check_pid()
+        future = Future()
+        if holds_writer():
+            # The writer thread needs the lock this thread holds, so a full queue would never drain
+            try:
+                self._queue.put_nowait((sql, params, future, tuple(before)))
+            except queue.Full:
+                raise RuntimeError("Write-behind queue is full inside transaction(); commit first.") from None
+            return future
+        self._queue.put((sql, params, future, tuple(before)))
+        return future
+
+    def flush(self, timeout=None):
+        # Barrier: returns once everything submitted before it is committed.
+        self._check_pid()
+        if self._blocked_by_caller("flush"):
+            return
+        barrier = Future()
+        self._queue.put((None, None, barrier, ()))
+        barrier.result(timeout)
+
+    def close(self, timeout=None):
+        if self._closed:
+            return
+        if os.getpid() != self._pid: # Forked and never used here: no thread of ours to stop
+            self._closed = True
+            return
+        self._blocked_by_caller("close")
+        self._closed = True
+        self._queue.put((_STOP, None, None, ()))
+        self._thread.join(timeout)
+
+    def pending(self):
+        self._check_pid()
+        return self._queue.qsize()
+
+    def _blocked_by_caller(self, action):
+        # Waiting on the writer thread while this thread owns the writer lock would never return.
+        # Nothing queued or in flight: nothing to wait for. Otherwise refuse instead of hanging.
+        if not holds_writer():
+            return False
+        if self._queue.unfinished_tasks:
+            raise RuntimeError(f"Cannot {action} queued writes inside transaction(); they need the writer lock.")
+        return True
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] is not None and batch[-1][0] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Futures are public, so a caller may have cancelled one; those rows are skipped
+            writes = [
+                item for item in batch
+                if item[0] is not None and item[0] is not _STOP and item[2].set_running_or_notify_cancel()
+            ]
+            try:
+                self._write(writes)
+            except Exception as e: # The thread must survive: flush() and every later save() wait on it
+                for _, _, future, _ in writes:
+                    if not future.done():
+                        future.set_exception(e)
+            for _ in batch:
+                self._queue.task_done() # unfinished_tasks counts items not yet written
+            tail_sql, _, tail_future, _ = batch[-1]
+            if tail_sql is None and tail_future.set_running_or_notify_cancel():
+                tail_future.set_result(None)
+            elif tail_sql is _STOP:
+                return
+
+    def _write(self, writes):
+        if not writes:
+            return
+        def write_batch():
+            with transaction() as cursor:
+                row_ids = []
+                for sql, params, _, before in writes:
+                    for statement in before:
+                        cursor.execute(*statement)
+                    cursor.execute(sql, params)
+                    row_ids.append(cursor.lastrowid)
+            return row_ids
+        try:
+            row_ids = retry(write_batch) # The batch rolls back as a unit, so rerunning it is safe
+        except Exception:
+            # One bad row should not fail the whole batch: replay each in its own transaction.
+            for sql, params, future, before in writes:
+                try:
+                    with transaction() as cursor:
+                        for statement in before:
+                            cursor.execute(*statement)
+                        cursor.execute(sql, params)
+                        row_id = cursor.lastrowid
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(row_id)
+            return
+        for (_, _, future, _), row_id in zip(writes, row_ids):
+            future.set_result(row_id)
@@ -1,21 +1,38 @@
-from lib.db.connection import get_connection
+import atexit
+from lib.db.connection import transaction, fetch_one, fetch_all, holds_writer, after_commit, on_rollback
 from lib.models.author import Author 
 from lib.models.magazine import Magazine 
-class Article:
-    CONN = get_connection()
-    CURSOR = CONN.cursor()
+CLEAN = frozenset() # Shared empty dirty set, so clean instances allocate none
+TITLE_FIELDS = frozenset(("title", "magazine_id")) # Changes that Magazine's title cache must see
 
+class Article:
+    __slots__ = ('_id', '_title', '_content', '_content_hash', '_author_id', '_magazine_id', '_dirty', '_pending')
     _all_articles = {} 
+    TABLE = "articles"
+    COLUMNS = ("id", "title", "content", "author_id", "magazine_id")
+    HASHED_FIELDS = ("content",) # May live in content_blobs, keyed by content_hash
+    write_behind = None # Set by enable_write_behind() to queue inserts/updates off the request path
+    content_codec = None # "zlib"/"lzma": store bodies deduplicated and compressed in content_blobs
   #  Initialize the class with the database connection and cursor
     def __init__(self, title, content, author_id, magazine_id, id=None):
+        self._pending = None
+        self._content_hash = None
+        self._dirty = CLEAN # Columns changed since load or the last save()
         self.id = id
         self.title = title
         self.content = content
         self.author_id = author_id
         self.magazine_id = magazine_id
+        if id is None:
+            self._dirty = CLEAN # A new row is inserted whole; with an id, save() rewrites every column
 
     @property
     def id(self):
+        if self._pending is not None: # Queued insert: wait for the writer to assign the id
+            if not self._pending.done() and holds_writer(): # The writer thread needs the lock we hold
+                raise RuntimeError("Queued article has no id yet inside transaction(); commit first.")
+            self._id = self._pending.result()
+            self._pending = None
         return self._id
 
     @id.setter
@@ -31,10 +48,15 @@ class Article:
             raise TypeError("Title must be a string.")
         if not (5 <= len(value) <= 50):
             raise ValueError("Title must be a string between 5 and 50 characters, inclusive.")
+        if getattr(self, '_title', None) != value:
+            self._dirty = self._dirty | {'title'}
         self._title = value
 
     @property
     def content(self):
+        if self._content is None and self._content_hash is not None: # Decompressed on first access
+            from lib.db import blobs
+            self._content = blobs.load(self._content_hash)
         return self._content
 
     @content.setter
@@ -43,6 +65,8 @@ class Article:
             raise TypeError("Content must be a string.")
         if len(value) == 0:
             raise ValueError("Content must be a non-empty string.")
+        if getattr(self, '_content', None) != value:
+            self._dirty = self._dirty | {'content'}
         self._content = value
 
     @property
@@ -57,6 +81,8 @@ class Article:
             raise TypeError("author_id must be an integer.")
         if value <= 0:
             raise ValueError("author_id must be a positive integer.")
+        if getattr(self, '_author_id', None) != value:
+            self._dirty = self._dirty | {'author_id'}
         self._author_id = value
 
     @property
@@ -71,26 +97,88 @@ class Article:
             raise TypeError("magazine_id must be an integer.")
         if value <= 0:
             raise ValueError("magazine_id must be a positive integer.")
+        if getattr(self, '_magazine_id', None) != value:
+            self._dirty = self._dirty | {'magazine_id'}
         self._magazine_id = value
 # Save the article to the database
     def save(self):
         if self.id is None:
-            sql = """
-                INSERT INTO articles (title, content, author_id, magazine_id)
-                VALUES (?, ?, ?, ?)
-            """
-            Article.CURSOR.execute(sql, (self.title, self.content, self.author_id, self.magazine_id))
-            self.id = Article.CURSOR.lastrowid
+            values, blob = self._column_values(("title", "content", "author_id", "magazine_id"))
+            sql = f"INSERT INTO articles ({', '.join(values)}) VALUES ({', '.join('?' for _ in values)})"
+            params = list(values.values())
+            if Article.write_behind is not None:
+                # The blob rides with the row, so no batch boundary (or collect_garbage()) splits them
+                self._pending = Article.write_behind.submit(sql, params, before=[blob] if blob else ())
+                self._pending.add_done_callback(self._cache_when_written)
+                self._dirty = CLEAN
+                return self._pending
+            with transaction() as cursor:
+                if blob is not None:
+                    cursor.execute(*blob)
+                cursor.execute(sql, params)
+                self.id = cursor.lastrowid
             Article._all_articles[self.id] = self
+            Magazine._article_written(self.magazine_id, self.id, self.title)
+            self._dirty = CLEAN
+            on_rollback(lambda: self._rolled_back(None)) # Inside an outer transaction() this can still be undone
         else:
-            sql = """
-                UPDATE articles
-                SET title = ?, content = ?, author_id = ?, magazine_id = ?
-                WHERE id = ?
-            """
-            Article.CURSOR.execute(sql, (self.title, self.content, self.author_id, self.magazine_id, self.id))
             Article._all_articles[self.id] = self
-        Article.CONN.commit()
+            if not self._dirty:
+                return None # Nothing changed: no statement, no commit
+            values, blob = self._column_values([column for column in Article.COLUMNS if column in self._dirty])
+            sql = f"UPDATE articles SET {', '.join(f'{column} = ?' for column in values)} WHERE id = ?"
+            params = list(values.values()) + [self.id]
+            if Article.write_behind is not None:
+                future = Article.write_behind.submit(sql, params, before=[blob] if blob else ())
+                if self._dirty & TITLE_FIELDS:
+                    moved = "magazine_id" in self._dirty
+                    future.add_done_callback(lambda f: f.exception() or self._titles_written(moved))
+                self._dirty = CLEAN
+                return future
+            with transaction() as cursor:
+                if blob is not None:
+                    cursor.execute(*blob)
+                cursor.execute(sql, params)
+            if self._dirty & TITLE_FIELDS:
+                self._titles_written("magazine_id" in self._dirty)
+            written, self._dirty = self._dirty, CLEAN
+            on_rollback(lambda: self._rolled_back(written))
+
+    def _rolled_back(self, written):
+        # The enclosing transaction() rolled back this save: an insert forgets its id and cached
+        # copy, an update gets its columns marked dirty again so the next save() rewrites them
+        if written is None:
+            if Article._all_articles.get(self._id) is self:
+                del Article._all_articles[self._id]
+            self._id = None
+        else:
+            self._dirty = self._dirty | written
+
+    def _column_values(self, columns):
+        # {column: value} to write, plus the content_blobs insert when bodies are stored by hash
+        values = {}
+        blob = None
+        for column in columns:
+            if column != "content":
+                values[column] = getattr(self, column)
+            elif Article.content_codec is None:
+                values["content"] = self.content
+                values["content_hash"] = None
+            else:
+                from lib.db import blobs
+                self._content_hash, params = blobs.encode(self.content, Article.content_codec)
+                blob = (blobs.INSERT_SQL, params)
+                values["content"] = None
+                values["content_hash"] = self._content_hash
+        return values, blob
+
+    def _cache_when_written(self, future):
+        if future.exception() is None:
+            Article._all_articles[future.result()] = self
+            Magazine._article_written(self.magazine_id, future.result(), self.title)
+
+    def _titles_written(self, moved):
+        Magazine._article_written(self.magazine_id, self.id, self.title, moved)
     # Class method to create a new article and save it to the database  
     @classmethod
     def create(cls, title, content, author_id, magazine_id):
@@ -98,33 +186,135 @@ class Article:
         article.save()
         return article
 
+    @classmethod
+    def enable_write_behind(cls, batch_size=500, flush_interval_ms=50, max_pending=10000):
+        # Opt-in: save() enqueues and returns a Future instead of committing inline.
+        if cls.write_behind is None:
+            from lib.db.write_behind import WriteBehindQueue # Pulls in concurrent.futures; keep it off the import path
+            cls.write_behind = WriteBehindQueue(batch_size, flush_interval_ms, max_pending)
+            atexit.register(cls.disable_write_behind)
+        return cls.write_behind
+
+    @classmethod
+    def disable_write_behind(cls):
+        if cls.write_behind is not None:
+            cls.write_behind.close()
+            cls.write_behind = None
+            atexit.unregister(cls.disable_write_behind)
+
+    @classmethod
+    def enable_content_store(cls, codec="zlib"):
+        # New and edited bodies go to content_blobs, compressed and deduplicated by hash
+        from lib.db import blobs
+        if codec not in blobs.CODECS:
+            raise ValueError(f"codec must be one of {blobs.CODECS}.")
+        cls.content_codec = codec
+
+    @classmethod
+    def disable_content_store(cls):
+        cls.content_codec = None
+
+    @classmethod
+    def flush(cls):
+        if cls.write_behind is not None:
+            cls.write_behind.flush()
+
     def delete(self):
+        Article.flush() # Queued writes for this row must land before it is removed
         sql = "DELETE FROM articles WHERE id = ?"
-        Article.CURSOR.execute(sql, (self.id,))
-        Article.CONN.commit()
-        if self.id in Article._all_articles:
-            del Article._all_articles[self.id]
+        with transaction() as cursor:
+            cursor.execute(sql, (self.id,))
+        id = self.id
+        from lib.db import catalog
+        catalog.forget("articles", [id])
+        if id in Article._all_articles:
+            del Article._all_articles[id]
+        Magazine._article_deleted(self.magazine_id, id)
         self.id = None 
+        on_rollback(lambda: self._delete_rolled_back(id))
+
+    def _delete_rolled_back(self, id):
+        # The enclosing transaction() rolled back this delete: the row is back
+        self.id = id
+        Article._all_articles.setdefault(id, self)
+
+    @classmethod
+    def delete_where(cls, **filters):
+        from lib.db.bulk import delete_where, evict
+        cls.flush()
+        deleted = delete_where("articles", cls.COLUMNS, filters, hashed=cls.HASHED_FIELDS)
+        evict(cls._all_articles, deleted["articles"], deleted=True)
+        after_commit(Magazine.clear_title_cache)
+        return len(deleted["articles"])
+
+    @classmethod
+    def update_where(cls, values, **filters):
+        from lib.db.bulk import evict, update_where
+        probe = cls.__new__(cls)
+        probe._dirty = CLEAN
+        for field, value in values.items():
+            if field != "id":
+                setattr(probe, field, value) # Run the property validation
+        cls.flush()
+        values = dict(values)
+        with transaction() as cursor: # The blob and the rows pointing at it commit together
+            if "content" in values:
+                # Same storage rules as save(): inline with no hash, or a hash and no inline copy
+                if cls.content_codec is None:
+                    values["content_hash"] = None
+                else:
+                    from lib.db import blobs
+                    values["content_hash"], params = blobs.encode(values["content"], cls.content_codec)
+                    values["content"] = None
+                    cursor.execute(blobs.INSERT_SQL, params)
+            updated = update_where("articles", cls.COLUMNS, values, filters, hashed=cls.HASHED_FIELDS)
+        evict(cls._all_articles, updated)
+        if TITLE_FIELDS.intersection(values):
+            after_commit(Magazine.clear_title_cache)
+        return len(updated)
     @classmethod
     def find_by_id(cls, id):
         if id in cls._all_articles:
             return cls._all_articles[id]
 
         sql = "SELECT * FROM articles WHERE id = ?"
-        Article.CURSOR.execute(sql, (id,))
-        row = Article.CURSOR.fetchone()
+        row = fetch_one(sql, (id,))
         if row:
-            article = cls(row['title'], row['content'], row['author_id'], row['magazine_id'], row['id'])
+            article = cls._from_row(row)
             cls._all_articles[article.id] = article
             return article
         return None
+    @classmethod
+    def find_by_ids(cls, ids):
+        # Batched lookup: input order, None for ids that do not exist
+        from lib.db.bulk import find_by_ids
+        return find_by_ids(cls, cls._all_articles, ids)
+
+     
+    @classmethod
+    def _from_row(cls, row):
+        # Trusted path for rows read from the database: skips property validation
+        article = cls.__new__(cls)
+        article._id = row['id']
+        article._title = row['title']
+        article._content = row['content'] # None until first access when stored in content_blobs
+        article._content_hash = row['content_hash']
+        article._author_id = row['author_id']
+        article._magazine_id = row['magazine_id']
+        article._dirty = CLEAN
+        article._pending = None
+        return article
+
+    @classmethod
+    def where(cls, **filters):
+        from lib.db.query import Query
+        return Query(cls).where(**filters)
      
     @classmethod
     def get_all(cls):
         sql = "SELECT * FROM articles"
-        Article.CURSOR.execute(sql)
-        rows = Article.CURSOR.fetchall()
-        return [cls(row['title'], row['content'], row['author_id'], row['magazine_id'], row['id']) for row in rows]
+        rows = fetch_all(sql)
+        return [cls._from_row(row) for row in rows]
 
     def author(self):
         from lib.models.author import Author # Local import to avoid circular dependency
@@ -1,14 +1,20 @@
-from lib.db.connection import get_connection
+from lib.db.connection import transaction, fetch_one, fetch_all, after_commit, on_rollback
 
-class Author:
-    CONN = get_connection()
-    CURSOR = CONN.cursor()
+CLEAN = frozenset() # Shared empty dirty set, so clean instances allocate none
 
+class Author:
+    __slots__ = ('_id', '_name', '_dirty')
     _all_authors = {} 
+    TABLE = "authors"
+    COLUMNS = ("id", "name")
+    HASHED_FIELDS = ()
 
     def __init__(self, name, id=None):
+        self._dirty = CLEAN # Columns changed since load or the last save()
         self.id = id
         self.name = name
+        if id is None:
+            self._dirty = CLEAN # A new row is inserted whole; with an id, save() rewrites every column
        # Initialize the class with the database connection and cursor
     @property
     def id(self):
@@ -28,19 +34,38 @@ class Author:
             raise TypeError("Name must be a string.")
         if not (2 <= len(value) <= 50):
             raise ValueError("Name must be a string between 2 and 50 characters, inclusive.")
+        if getattr(self, '_name', None) != value:
+            self._dirty = self._dirty | {'name'}
         self._name = value
      # Property for name with validation
     def save(self):
         if self.id is None:
             sql = "INSERT INTO authors (name) VALUES (?)"
-            Author.CURSOR.execute(sql, (self.name,))
-            self.id = Author.CURSOR.lastrowid
+            with transaction() as cursor:
+                cursor.execute(sql, (self.name,))
+                self.id = cursor.lastrowid
             Author._all_authors[self.id] = self
+            on_rollback(lambda: self._rolled_back(None)) # Inside an outer transaction() this can still be undone
         else:
-            sql = "UPDATE authors SET name = ? WHERE id = ?"
-            Author.CURSOR.execute(sql, (self.name, self.id))
             Author._all_authors[self.id] = self
-        Author.CONN.commit()
+            if not self._dirty:
+                return # Nothing changed: no statement, no commit
+            sql = "UPDATE authors SET name = ? WHERE id = ?"
+            with transaction() as cursor:
+                cursor.execute(sql, (self.name, self.id))
+            written = self._dirty
+            on_rollback(lambda: self._rolled_back(written))
+        self._dirty = CLEAN
+
+    def _rolled_back(self, written):
+        # The enclosing transaction() rolled back this save: an insert forgets its id and cached
+        # copy, an update gets its columns marked dirty again so the next save() rewrites them
+        if written is None:
+            if Author._all_authors.get(self._id) is self:
+                del Author._all_authors[self._id]
+            self._id = None
+        else:
+            self._dirty = self._dirty | written
    # Save the author to the database, either inserting or updating
     @classmethod
     def create(cls, name):
@@ -49,50 +74,116 @@ class Author:
         return author
 # Class method to create a new author and save it to the database
     def delete(self):
-        sql = "DELETE FROM authors WHERE id = ?"
-        Author.CURSOR.execute(sql, (self.id,))
-        Author.CONN.commit()
-        if self.id in Author._all_authors:
-            del Author._all_authors[self.id]
+        id = self.id
+        Author.delete_where(id=id)
+        on_rollback(lambda: setattr(self, 'id', id))
         self.id = None 
+# Delete the author and their articles
+    @classmethod
+    def delete_where(cls, **filters):
+        from lib.db.bulk import delete_where, evict
+        from lib.models.article import Article
+        Article.flush()
+        deleted = delete_where("authors", cls.COLUMNS, filters, cascade=(("articles", "author_id"),))
+        evict(Article._all_articles, deleted["articles"], deleted=True)
+        evict(cls._all_authors, deleted["authors"], deleted=True)
+        if deleted["articles"]:
+            from lib.models.magazine import Magazine
+            after_commit(Magazine.clear_title_cache)
+        return len(deleted["authors"])
+
+    @classmethod
+    def update_where(cls, values, **filters):
+        from lib.db.bulk import evict, update_where
+        probe = cls.__new__(cls)
+        probe._dirty = CLEAN
+        for field, value in values.items():
+            if field != "id":
+                setattr(probe, field, value) # Run the property validation
+        updated = update_where("authors", cls.COLUMNS, values, filters)
+        evict(cls._all_authors, updated)
+        return len(updated)
     @classmethod
     def find_by_id(cls, id):
         if id in cls._all_authors:
             return cls._all_authors[id]
 
+        from lib.db.catalog import active as active_catalog
+        catalog = active_catalog()
+        if catalog is not None: # Shared mmap snapshot: not copied into this process's identity map
+            row = catalog.author(id)
+            if row is not None:
+                return cls._from_row(row)
+
         sql = "SELECT * FROM authors WHERE id = ?"
-        Author.CURSOR.execute(sql, (id,))
-        row = Author.CURSOR.fetchone()
+        row = fetch_one(sql, (id,))
         if row:
-            author = cls(row['name'], row['id'])
+            author = cls._from_row(row)
             cls._all_authors[author.id] = author
             return author
         return None
-  # Find an author by ID, either from the cache or the database
+  # Find an author by ID, from the cache, the catalog snapshot or the database
+    @classmethod
+    def find_by_ids(cls, ids):
+        # Batched lookup: input order, None for ids that do not exist
+        from lib.db.bulk import find_by_ids
+        return find_by_ids(cls, cls._all_authors, ids)
+
     @classmethod
     def find_by_name(cls, name):
         sql = "SELECT * FROM authors WHERE name = ?"
-        Author.CURSOR.execute(sql, (name,))
-        row = Author.CURSOR.fetchone()
+        row = fetch_one(sql, (name,))
         if row:
-            author = cls(row['name'], row['id'])
+            author = cls._from_row(row)
             cls._all_authors[author.id] = author
             return author
         return None
 
+    @classmethod
+    def get_or_create(cls, name):
+        return cls.upsert_many([name])[0]
+
+    @classmethod
+    def upsert_many(cls, names):
+        # One pass of batched INSERT ... ON CONFLICT(name) ... RETURNING; results follow input order
+        from lib.db.bulk import evict, upsert
+        unique_names = list(dict.fromkeys(cls(name).name for name in names))
+        rows = upsert("authors", ("name",), [(name,) for name in unique_names], conflict="name")
+        by_name = {}
+        for row in rows:
+            author = cls._all_authors.get(row['id'])
+            if author is None:
+                author = cls._from_row(row)
+                cls._all_authors[author.id] = author
+            by_name[row['name']] = author
+        on_rollback(lambda: evict(cls._all_authors, [row['id'] for row in rows]))
+        return [by_name[name] for name in names]
+  # Get or create authors by name without a separate lookup round trip
+    @classmethod
+    def _from_row(cls, row):
+        # Trusted path for rows read from the database: skips property validation
+        author = cls.__new__(cls)
+        author._id = row['id']
+        author._name = row['name']
+        author._dirty = CLEAN
+        return author
+
+    @classmethod
+    def where(cls, **filters):
+        from lib.db.query import Query
+        return Query(cls).where(**filters)
+
     @classmethod
     def get_all(cls):
         sql = "SELECT * FROM authors"
-        Author.CURSOR.execute(sql)
-        rows = Author.CURSOR.fetchall()
-        return [cls(row['name'], row['id']) for row in rows]
+        rows = fetch_all(sql)
+        return [cls._from_row(row) for row in rows]
    # Get all authors from the database
     def articles(self):
         from lib.models.article import Article 
         sql = "SELECT * FROM articles WHERE author_id = ?"
-        Author.CURSOR.execute(sql, (self.id,))
-        rows = Author.CURSOR.fetchall()
-        return [Article(row['title'], row['content'], row['author_id'], row['magazine_id'], row['id']) for row in rows]
+        rows = fetch_all(sql, (self.id,))
+        return [Article._from_row(row) for row in rows]
 # Get all articles written by the author
     def magazines(self):
         from lib.models.magazine import Magazine 
@@ -102,18 +193,46 @@ class Author:
             JOIN articles ON magazines.id = articles.magazine_id
             WHERE articles.author_id = ?
         """
-        Author.CURSOR.execute(sql, (self.id,))
-        rows = Author.CURSOR.fetchall()
-        return [Magazine(row['name'], row['category'], row['id']) for row in rows]
+        rows = fetch_all(sql, (self.id,))
+        return [Magazine._from_row(row) for row in rows]
     # Get all magazines written by the author
     def topic_areas(self):
-        magazines_by_author = self.magazines()
-        if not magazines_by_author:
-            return []
-        
-        
-        topic_set = set(magazine.category for magazine in magazines_by_author)
-        return list(topic_set)
+        # Read from the trigger-maintained category index instead of joining magazines each call
+        sql = "SELECT category FROM author_category_weights WHERE author_id = ?"
+        rows = fetch_all(sql, (self.id,))
+        return [row['category'] for row in rows]
+
+    def recommended_magazines(self, k=5):
+        # Magazines the author has not written for, in the categories they write most,
+        # busiest first. Served from the precomputed recommendation index.
+        from lib.models.magazine import Magazine
+        sql = """
+            SELECT magazines.*
+            FROM author_category_weights AS weights
+            JOIN magazine_activity AS activity ON activity.category = weights.category
+            JOIN magazines ON magazines.id = activity.magazine_id
+            WHERE weights.author_id = ?
+              AND NOT EXISTS (
+                  SELECT 1 FROM articles
+                  WHERE articles.author_id = weights.author_id AND articles.magazine_id = activity.magazine_id
+              )
+            ORDER BY weights.weight DESC, activity.article_count DESC, activity.magazine_id
+            LIMIT ?
+        """
+        rows = fetch_all(sql, (self.id, k))
+        return [Magazine._from_row(row) for row in rows]
+
+    def similar_authors(self, k=10):
+        # Authors sharing the most magazines, precomputed by lib/analytics/similarity.py
+        sql = """
+            SELECT authors.*
+            FROM author_similarity
+            JOIN authors ON authors.id = author_similarity.similar_author_id
+            WHERE author_similarity.author_id = ? AND author_similarity.rank < ?
+            ORDER BY author_similarity.rank
+        """
+        rows = fetch_all(sql, (self.id, k))
+        return [Author._from_row(row) for row in rows]
 
     def __repr__(self):
         return f"<Author ID: {self.id}, Name: {self.name}>"
\ No newline at end of file
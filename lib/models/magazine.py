@@ -1,15 +1,26 @@
-from lib.db.connection import get_connection
+from collections import OrderedDict
+from lib.db.connection import transaction, fetch_one, fetch_all, after_commit, on_rollback, in_snapshot, in_write_transaction
 
-class Magazine:
-    CONN = get_connection()
-    CURSOR = CONN.cursor()
+CLEAN = frozenset() # Shared empty dirty set, so clean instances allocate none
+TITLE_ORDERS = {"id": "id", "-id": "id DESC", "title": "title, id", "-title": "title DESC, id DESC"}
 
+class Magazine:
+    __slots__ = ('_id', '_name', '_category', '_dirty')
     _all_magazines = {} 
+    TABLE = "magazines"
+    COLUMNS = ("id", "name", "category")
+    HASHED_FIELDS = ()
+    title_cache_size = 0 # Set by enable_title_cache(); magazines whose titles article_titles() keeps in memory
+    _title_cache = OrderedDict() # magazine id -> {article id: title}, least recently used first
+    _title_generation = 0 # Bumped by every article write, so a load that raced one is not cached
  # Initialize the class with the database connection and cursor
     def __init__(self, name, category, id=None):
+        self._dirty = CLEAN # Columns changed since load or the last save()
         self.id = id
         self.name = name
         self.category = category
+        if id is None:
+            self._dirty = CLEAN # A new row is inserted whole; with an id, save() rewrites every column
 
     @property
     def id(self):
@@ -29,6 +40,8 @@ class Magazine:
             raise TypeError("Name must be a string.")
         if not (2 <= len(value) <= 16):
             raise ValueError("Name must be a string between 2 and 16 characters, inclusive.")
+        if getattr(self, '_name', None) != value:
+            self._dirty = self._dirty | {'name'}
         self._name = value
 
     @property
@@ -41,6 +54,8 @@ class Magazine:
             raise TypeError("Category must be a string.")
         if len(value) == 0:
             raise ValueError("Category must be a non-empty string.")
+        if getattr(self, '_category', None) != value:
+            self._dirty = self._dirty | {'category'}
         self._category = value
    # Property for category with validation
     def save(self):
@@ -49,18 +64,32 @@ class Magazine:
                 INSERT INTO magazines (name, category)
                 VALUES (?, ?)
             """
-            Magazine.CURSOR.execute(sql, (self.name, self.category))
-            self.id = Magazine.CURSOR.lastrowid
+            with transaction() as cursor:
+                cursor.execute(sql, (self.name, self.category))
+                self.id = cursor.lastrowid
             Magazine._all_magazines[self.id] = self
+            on_rollback(lambda: self._rolled_back(None)) # Inside an outer transaction() this can still be undone
         else:
-            sql = """
-                UPDATE magazines
-                SET name = ?, category = ?
-                WHERE id = ?
-            """
-            Magazine.CURSOR.execute(sql, (self.name, self.category, self.id))
             Magazine._all_magazines[self.id] = self
-        Magazine.CONN.commit()
+            if not self._dirty:
+                return # Nothing changed: no statement, no commit
+            columns = [column for column in Magazine.COLUMNS if column in self._dirty]
+            sql = f"UPDATE magazines SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?"
+            with transaction() as cursor:
+                cursor.execute(sql, [getattr(self, column) for column in columns] + [self.id])
+            written = self._dirty
+            on_rollback(lambda: self._rolled_back(written))
+        self._dirty = CLEAN
+
+    def _rolled_back(self, written):
+        # The enclosing transaction() rolled back this save: an insert forgets its id and cached
+        # copy, an update gets its columns marked dirty again so the next save() rewrites them
+        if written is None:
+            if Magazine._all_magazines.get(self._id) is self:
+                del Magazine._all_magazines[self._id]
+            self._id = None
+        else:
+            self._dirty = self._dirty | written
 # Save the magazine to the database, either inserting or updating
     @classmethod
     def create(cls, name, category):
@@ -69,51 +98,127 @@ class Magazine:
         return magazine
 
     def delete(self):
-        sql = "DELETE FROM magazines WHERE id = ?"
-        Magazine.CURSOR.execute(sql, (self.id,))
-        Magazine.CONN.commit()
-        if self.id in Magazine._all_magazines:
-            del Magazine._all_magazines[self.id]
+        id = self.id
+        Magazine.delete_where(id=id)
+        on_rollback(lambda: setattr(self, 'id', id))
         self.id = None
-# Delete the magazine from the database and clear it from the cache
+# Delete the magazine and its articles from the database and clear them from the cache
+    @classmethod
+    def delete_where(cls, **filters):
+        from lib.db.bulk import delete_where, evict
+        from lib.models.article import Article
+        Article.flush()
+        deleted = delete_where("magazines", cls.COLUMNS, filters, cascade=(("articles", "magazine_id"),))
+        evict(Article._all_articles, deleted["articles"], deleted=True)
+        evict(cls._all_magazines, deleted["magazines"], deleted=True)
+        after_commit(cls.clear_title_cache)
+        return len(deleted["magazines"])
+
+    @classmethod
+    def update_where(cls, values, **filters):
+        from lib.db.bulk import evict, update_where
+        probe = cls.__new__(cls)
+        probe._dirty = CLEAN
+        for field, value in values.items():
+            if field != "id":
+                setattr(probe, field, value) # Run the property validation
+        updated = update_where("magazines", cls.COLUMNS, values, filters)
+        evict(cls._all_magazines, updated)
+        return len(updated)
     @classmethod
     def find_by_id(cls, id):
         if id in cls._all_magazines:
             return cls._all_magazines[id]
 
+        from lib.db.catalog import active as active_catalog
+        catalog = active_catalog()
+        if catalog is not None: # Shared mmap snapshot: not copied into this process's identity map
+            row = catalog.magazine(id)
+            if row is not None:
+                return cls._from_row(row)
+
         sql = "SELECT * FROM magazines WHERE id = ?"
-        Magazine.CURSOR.execute(sql, (id,))
-        row = Magazine.CURSOR.fetchone()
+        row = fetch_one(sql, (id,))
         if row:
-            magazine = cls(row['name'], row['category'], row['id'])
+            magazine = cls._from_row(row)
             cls._all_magazines[magazine.id] = magazine
             return magazine
         return None
-# Find a magazine by ID, either from the database
+# Find a magazine by ID, from the cache, the catalog snapshot or the database
+    @classmethod
+    def find_by_ids(cls, ids):
+        # Batched lookup: input order, None for ids that do not exist
+        from lib.db.bulk import find_by_ids
+        return find_by_ids(cls, cls._all_magazines, ids)
+
     @classmethod
     def find_by_name(cls, name):
         sql = "SELECT * FROM magazines WHERE name = ?"
-        Magazine.CURSOR.execute(sql, (name,))
-        row = Magazine.CURSOR.fetchone()
+        row = fetch_one(sql, (name,))
         if row:
-            magazine = cls(row['name'], row['category'], row['id'])
+            magazine = cls._from_row(row)
             cls._all_magazines[magazine.id] = magazine
             return magazine
         return None
 # Find a magazine by name, either from the database
+    @classmethod
+    def get_or_create(cls, name, category):
+        # An existing magazine keeps its stored category
+        from lib.db.bulk import upsert
+        magazine = cls(name, category)
+        row = upsert("magazines", ("name", "category"), [(magazine.name, magazine.category)], conflict="name")[0]
+        return cls._cached_from_upsert(row)
+
+    @classmethod
+    def upsert_many(cls, rows):
+        # rows are (name, category) pairs; existing magazines take the new category
+        from lib.db.bulk import evict, upsert
+        latest = {}
+        for name, category in rows:
+            magazine = cls(name, category)
+            latest[magazine.name] = magazine.category
+        returned = upsert("magazines", ("name", "category"), list(latest.items()), conflict="name", update=("category",))
+        by_name = {row['name']: cls._cached_from_upsert(row) for row in returned}
+        on_rollback(lambda: evict(cls._all_magazines, [row['id'] for row in returned]))
+        return [by_name[name] for name, _ in rows]
+
+    @classmethod
+    def _cached_from_upsert(cls, row):
+        magazine = cls._all_magazines.get(row['id'])
+        if magazine is None:
+            magazine = cls._from_row(row)
+            cls._all_magazines[magazine.id] = magazine
+        else:
+            magazine.category = row['category']
+            magazine._dirty = magazine._dirty - {'category'} # Already what the database holds
+        return magazine
+# Get or create magazines by name in batched upserts
+    @classmethod
+    def _from_row(cls, row):
+        # Trusted path for rows read from the database: skips property validation
+        magazine = cls.__new__(cls)
+        magazine._id = row['id']
+        magazine._name = row['name']
+        magazine._category = row['category']
+        magazine._dirty = CLEAN
+        return magazine
+
+    @classmethod
+    def where(cls, **filters):
+        from lib.db.query import Query
+        return Query(cls).where(**filters)
+
     @classmethod
     def get_all(cls):
         sql = "SELECT * FROM magazines"
-        Magazine.CURSOR.execute(sql)
-        rows = Magazine.CURSOR.fetchall()
-        return [cls(row['name'], row['category'], row['id']) for row in rows]
+        rows = fetch_all(sql)
+        return [cls._from_row(row) for row in rows]
 
     def articles(self):
         from lib.models.article import Article 
         sql = "SELECT * FROM articles WHERE magazine_id = ?"
-        Magazine.CURSOR.execute(sql, (self.id,))
-        rows = Magazine.CURSOR.fetchall()
-        return [Article(row['title'], row['content'], row['author_id'], row['magazine_id'], row['id']) for row in rows]
+        rows = fetch_all(sql, (self.id,))
+        return [Article._from_row(row) for row in rows]
 
     def authors(self):
         from lib.models.author import Author 
@@ -123,13 +228,83 @@ class Magazine:
             JOIN articles ON authors.id = articles.author_id
             WHERE articles.magazine_id = ?
         """
-        Magazine.CURSOR.execute(sql, (self.id,))
-        rows = Magazine.CURSOR.fetchall()
-        return [Author(row['name'], row['id']) for row in rows]
+        rows = fetch_all(sql, (self.id,))
+        return [Author._from_row(row) for row in rows]
+
+    def article_titles(self, order_by="id", limit=None):
+        # Titles only, read from the (magazine_id, id, title) index; [] when there are none
+        if order_by not in TITLE_ORDERS:
+            raise ValueError(f"order_by must be one of {tuple(TITLE_ORDERS)}.")
+        # A snapshot must see its own point in time, and a write transaction its own uncommitted writes
+        if Magazine.title_cache_size and not in_snapshot() and not in_write_transaction():
+            titles = self._cached_titles()
+            if order_by.lstrip("-") == "title":
+                result = [title for _, title in sorted(titles.items(), key=lambda item: (item[1], item[0]))]
+            else:
+                result = list(titles.values())
+            if order_by.startswith("-"):
+                result.reverse()
+            return result if limit is None else result[:limit]
+        sql = f"SELECT title FROM articles WHERE magazine_id = ? ORDER BY {TITLE_ORDERS[order_by]} LIMIT ?"
+        rows = fetch_all(sql, (self.id, -1 if limit is None else limit))
+        return [row[0] for row in rows]
+
+    def _cached_titles(self):
+        titles = Magazine._title_cache.get(self.id)
+        if titles is not None:
+            try:
+                Magazine._title_cache.move_to_end(self.id) # A hit makes it the last to be evicted
+            except KeyError: # Evicted by another thread in between
+                pass
+        else:
+            generation = Magazine._title_generation
+            rows = fetch_all("SELECT id, title FROM articles WHERE magazine_id = ? ORDER BY id", (self.id,))
+            titles = {row[0]: row[1] for row in rows}
+            if generation == Magazine._title_generation:
+                if len(Magazine._title_cache) >= Magazine.title_cache_size:
+                    Magazine._title_cache.pop(next(iter(Magazine._title_cache)), None) # Least recently used
+                Magazine._title_cache[self.id] = titles
+        return titles
+
+    @classmethod
+    def enable_title_cache(cls, size=256):
+        # article_titles() serves up to `size` magazines from memory, kept current by Article writes
+        cls.title_cache_size = size
+
+    @classmethod
+    def disable_title_cache(cls):
+        cls.title_cache_size = 0
+        cls.clear_title_cache()
+
+    @classmethod
+    def clear_title_cache(cls):
+        cls._title_generation += 1
+        cls._title_cache.clear()
+
+    @classmethod
+    def _article_written(cls, magazine_id, article_id, title, moved=False):
+        after_commit(lambda: cls._title_written(magazine_id, article_id, title, moved)) # Other threads read the cache
 
-    def article_titles(self):
-        articles_in_magazine = self.articles()
-        return [article.title for article in articles_in_magazine] if articles_in_magazine else None
+    @classmethod
+    def _title_written(cls, magazine_id, article_id, title, moved):
+        cls._title_generation += 1
+        if moved:
+            cls._title_cache.clear() # The magazine it moved from is not known here
+            return
+        titles = cls._title_cache.get(magazine_id)
+        if titles is not None:
+            titles[article_id] = title # New ids are the largest, so id order holds
+
+    @classmethod
+    def _article_deleted(cls, magazine_id, article_id):
+        after_commit(lambda: cls._title_deleted(magazine_id, article_id))
+
+    @classmethod
+    def _title_deleted(cls, magazine_id, article_id):
+        cls._title_generation += 1
+        titles = cls._title_cache.get(magazine_id)
+        if titles is not None:
+            titles.pop(article_id, None)
 
 
     def contributing_authors(self):
@@ -142,13 +317,24 @@ class Magazine:
             GROUP BY authors.id, authors.name
             HAVING article_count >= 3
         """
-        Magazine.CURSOR.execute(sql, (self.id,))
-        rows = Magazine.CURSOR.fetchall()
+        rows = fetch_all(sql, (self.id,))
         
         if not rows:
             return None 
         
-        return [Author(row['name'], row['id']) for row in rows]
+        return [Author._from_row(row) for row in rows]
+
+    def similar_magazines(self, k=10):
+        # Magazines with the most overlapping authors, precomputed by lib/analytics/similarity.py
+        sql = """
+            SELECT magazines.*
+            FROM magazine_similarity
+            JOIN magazines ON magazines.id = magazine_similarity.similar_magazine_id
+            WHERE magazine_similarity.magazine_id = ? AND magazine_similarity.rank < ?
+            ORDER BY magazine_similarity.rank
+        """
+        rows = fetch_all(sql, (self.id, k))
+        return [Magazine._from_row(row) for row in rows]
 
     def __repr__(self):
         return f"<Magazine ID: {self.id}, Name: {self.name}, Category: {self.category}>"
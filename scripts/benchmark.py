@@ -0,0 +1,191 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.db import connection
+
+BENCHMARKS = []
+
+def benchmark(fn):
+    BENCHMARKS.append(fn)
+    return fn
+
+@contextmanager
+def temp_database():
+    # Every benchmark runs against its own throwaway database built from schema.sql
+    with tempfile.TemporaryDirectory() as tmp:
+        previous = connection.DATABASE
+        connection.close_all()
+        connection.DATABASE = os.path.join(tmp, 'bench.db')
+        conn = connection.get_connection()
+        with open(os.path.join(ROOT, 'lib', 'db', 'schema.sql')) as f:
+            conn.executescript(f.read())
+        conn.close()
+        try:
+            yield connection.DATABASE
+        finally:
+            connection.close_all()
+            connection.DATABASE = previous
+
+def timed(fn, repeat=5):
+    # Best of `repeat` runs, in seconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+IMPORT_BUDGET_MS = 3.0 # What importing the models may add on top of sqlite3 itself
+
+@benchmark
+def import_models():
+    # Cumulative import time of lib.models.article in a fresh interpreter, from -X importtime,
+    # minus sqlite3 (the floor any version pays). Fails when our own share exceeds the budget.
+    # Runs in an empty directory so an accidental connect would show up as a new articles.db.
+    subprocess.run([sys.executable, '-m', 'compileall', '-q', os.path.join(ROOT, 'lib')], check=True) # No stale .pyc
+    totals, own = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(10):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', 'import lib.models.article'],
+                cwd=tmp, env={**os.environ, 'PYTHONPATH': ROOT}, capture_output=True, text=True, check=True,
+            )
+            cumulative = {}
+            for line in result.stderr.splitlines():
+                parts = line.split('|')
+                if len(parts) == 3 and parts[1].strip().isdigit():
+                    cumulative[parts[2].strip()] = int(parts[1]) / 1000.0
+            totals.append(cumulative['lib.models.article'])
+            own.append(cumulative['lib.models.article'] - cumulative.get('sqlite3', 0.0))
+        created = os.path.exists(os.path.join(tmp, 'articles.db'))
+    assert not created, "Importing the models opened the database."
+    assert min(own) <= IMPORT_BUDGET_MS, f"Model import adds {min(own):.2f} ms over sqlite3; budget is {IMPORT_BUDGET_MS} ms."
+    return {
+        'import lib.models.article (ms, best of 10)': round(min(totals), 2),
+        'of which not sqlite3 (ms)': round(min(own), 2),
+        'budget (ms)': IMPORT_BUDGET_MS,
+        'database file created on import': created,
+    }
+
+def seed_articles(count):
+    from lib.db.connection import transaction
+    with transaction() as cursor:
+        cursor.execute("INSERT INTO authors (name) VALUES ('Bench Author')")
+        author_id = cursor.lastrowid
+        cursor.execute("INSERT INTO magazines (name, category) VALUES ('Bench Mag', 'Bench')")
+        magazine_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO articles (title, content, author_id, magazine_id) VALUES (?, ?, ?, ?)",
+            ((f"Bench Article {i}", "Body " * 20, author_id, magazine_id) for i in range(count)),
+        )
+
+def allocated_per_item(build, count):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    items = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return items, round(allocated / count, 1)
+
+class DictArticle:
+    # The pre-__slots__ instance layout, for comparison
+    def __init__(self, row):
+        self._id = row['id']
+        self._title = row['title']
+        self._content = row['content']
+        self._content_hash = row['content_hash']
+        self._author_id = row['author_id']
+        self._magazine_id = row['magazine_id']
+        self._dirty = None
+        self._pending = None
+
+@benchmark
+def hydration(count=20000):
+    # get_all() through the trusted from-row path vs re-running the validating constructor
+    from lib.db.connection import fetch_all
+    from lib.models.article import Article
+    with temp_database():
+        seed_articles(count)
+        rows = fetch_all("SELECT * FROM articles")
+        validated = timed(lambda: [Article(r['title'], r['content'], r['author_id'], r['magazine_id'], r['id']) for r in rows])
+        trusted = timed(lambda: [Article._from_row(r) for r in rows])
+        get_all = timed(Article.get_all)
+
+        articles, slotted = allocated_per_item(lambda: [Article._from_row(r) for r in rows], count)
+        _, dict_based = allocated_per_item(lambda: [DictArticle(r) for r in rows], count)
+    return {
+        f'hydrate {count} rows, validating constructor (ms)': round(validated * 1000, 2),
+        f'hydrate {count} rows, _from_row (ms)': round(trusted * 1000, 2),
+        f'Article.get_all() {count} rows (ms)': round(get_all * 1000, 2),
+        'Article instance size (bytes)': sys.getsizeof(articles[0]),
+        'has __dict__': hasattr(articles[0], '__dict__'),
+        'bytes allocated per hydrated Article (__slots__)': slotted,
+        'bytes allocated per object, __dict__ layout': dict_based,
+    }
+
+@benchmark
+def recommendations(authors=2000, magazines=200, articles=200000):
+    # Latency of author.recommended_magazines() against the trigger-maintained index
+    import random
+    from lib.db.connection import transaction
+    from lib.models.author import Author
+    rng = random.Random(0)
+    with temp_database():
+        with transaction() as cursor:
+            cursor.executemany("INSERT INTO authors (name) VALUES (?)", ((f"Author {i}",) for i in range(authors)))
+            cursor.executemany(
+                "INSERT INTO magazines (name, category) VALUES (?, ?)",
+                ((f"Mag {i}", f"Category {i % 20}") for i in range(magazines)),
+            )
+        start = time.perf_counter()
+        with transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO articles (title, content, author_id, magazine_id) VALUES ('Title', 'Body', ?, ?)",
+                ((rng.randint(1, authors), rng.randint(1, magazines)) for _ in range(articles)),
+            )
+        insert = time.perf_counter() - start
+        sample = [Author.find_by_id(rng.randint(1, authors)) for _ in range(200)]
+        per_call = timed(lambda: [author.recommended_magazines(5) for author in sample]) / len(sample)
+    return {
+        f'insert {articles} articles with index triggers (s)': round(insert, 2),
+        'recommended_magazines(5) per call (ms)': round(per_call * 1000, 3),
+    }
+
+@benchmark
+def article_titles(count=5000):
+    # magazine.article_titles(): covering-index read vs the title cache
+    from lib.models.magazine import Magazine
+    with temp_database():
+        seed_articles(count)
+        magazine = Magazine.find_by_id(1)
+        indexed = timed(magazine.article_titles)
+        Magazine.enable_title_cache()
+        try:
+            magazine.article_titles()
+            cached = timed(magazine.article_titles)
+        finally:
+            Magazine.disable_title_cache()
+    return {
+        f'article_titles() {count} titles, covering index (ms)': round(indexed * 1000, 3),
+        f'article_titles() {count} titles, title cache (ms)': round(cached * 1000, 3),
+    }
+
+def main(names=()):
+    for fn in BENCHMARKS:
+        if names and fn.__name__ not in names:
+            continue
+        print(f"== {fn.__name__}")
+        for label, value in fn().items():
+            print(f"{label}: {value}")
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
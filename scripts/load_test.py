@@ -0,0 +1,217 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lib.db import connection
+
+# Mixed read/write load against the models from several processes x threads for a fixed
+# duration. Every (profile, cache) combination runs against its own freshly seeded database.
+DEFAULT_MIX = "authors=4,titles=2,find_article=3,create=1,update=1"
+SEED = {"authors": 200, "magazines": 50, "articles": 5000}
+
+def _pooled(): connection.READER_POOL_SIZE = 4
+def _single_reader(): connection.READER_POOL_SIZE = 1
+def _unpooled(): connection.READER_POOL_SIZE = 0 # Every read opens and closes its own connection
+def _fail_fast(): connection.configure(busy_timeout_ms=0, max_retries=0) # No busy wait, no retries
+def _deferred(): connection.configure(immediate=False) # BEGIN DEFERRED, upgrading to a write lock mid-transaction
+
+PROFILES = {
+    "pooled": _pooled, "single-reader": _single_reader, "unpooled": _unpooled,
+    "fail-fast": _fail_fast, "deferred": _deferred,
+}
+CACHES = ("warm", "cold", "write-behind", "catalog")
+
+def op_authors(rng):
+    from lib.models.magazine import Magazine
+    Magazine.find_by_id(rng.randint(1, SEED["magazines"])).authors()
+
+def op_titles(rng):
+    from lib.models.magazine import Magazine
+    Magazine.find_by_id(rng.randint(1, SEED["magazines"])).article_titles()
+
+def op_find_article(rng):
+    from lib.models.article import Article
+    Article.find_by_id(rng.randint(1, SEED["articles"]))
+
+# Writes return save()'s result: a Future under write-behind, which the worker resolves before reporting
+def op_create(rng):
+    from lib.models.article import Article
+    return Article("Load Article", "Load body", rng.randint(1, SEED["authors"]), rng.randint(1, SEED["magazines"])).save()
+
+def op_update(rng):
+    from lib.models.article import Article
+    article = Article.find_by_id(rng.randint(1, SEED["articles"]))
+    article.title = f"Updated {rng.random():.6f}"
+    return article.save()
+
+OPERATIONS = {
+    "authors": op_authors, "titles": op_titles, "find_article": op_find_article,
+    "create": op_create, "update": op_update,
+}
+
+def parse_mix(text):
+    # "authors=4,create=1" -> {"authors": 4, "create": 1}
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}; choose from {sorted(OPERATIONS)}.")
+        mix[name] = int(weight or 1)
+    return mix
+
+def seed(path):
+    connection.close_all()
+    connection.DATABASE = path
+    conn = connection.get_connection()
+    with open(os.path.join(ROOT, "lib", "db", "schema.sql")) as f:
+        conn.executescript(f.read())
+    conn.close()
+    with connection.transaction() as cursor:
+        cursor.executemany("INSERT INTO authors (name) VALUES (?)", ((f"Load Author {i}",) for i in range(SEED["authors"])))
+        cursor.executemany(
+            "INSERT INTO magazines (name, category) VALUES (?, ?)",
+            ((f"Load Mag {i}", f"Category {i % 10}") for i in range(SEED["magazines"])),
+        )
+        rng = random.Random(0)
+        cursor.executemany(
+            "INSERT INTO articles (title, content, author_id, magazine_id) VALUES (?, 'Body', ?, ?)",
+            ((f"Seed {i}", rng.randint(1, SEED["authors"]), rng.randint(1, SEED["magazines"])) for i in range(SEED["articles"])),
+        )
+    connection.close_all()
+
+def _clear_identity_maps():
+    from lib.models.article import Article
+    from lib.models.author import Author
+    from lib.models.magazine import Magazine
+    Article._all_articles.clear()
+    Author._all_authors.clear()
+    Magazine._all_magazines.clear()
+
+def run_process(path, profile, cache, mix, threads, duration, process_index):
+    # One worker process: `threads` threads issuing weighted-random operations until the deadline
+    from lib.models.article import Article
+    connection.DATABASE = path
+    PROFILES[profile]()
+    if cache == "write-behind":
+        Article.enable_write_behind()
+    elif cache == "catalog":
+        from lib.db import catalog
+        catalog.use(path + ".catalog")
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: {"locked": 0, "other": 0} for name in names}
+    queued = [] # (name, Future) for write-behind writes, settled after the threads stop
+    deadline = time.monotonic() + duration
+
+    def count_error(name, e):
+        locked = isinstance(e, sqlite3.OperationalError) and "locked" in str(e)
+        errors[name]["locked" if locked else "other"] += 1
+
+    def worker(thread_index):
+        rng = random.Random(process_index * 1000 + thread_index)
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            if cache == "cold":
+                _clear_identity_maps()
+            start = time.perf_counter()
+            try:
+                result = OPERATIONS[name](rng)
+            except Exception as e:
+                count_error(name, e)
+                continue
+            if isinstance(result, Future): # Latency runs until the write commits, not just the enqueue
+                result.add_done_callback(lambda f, name=name, start=start: f.exception() is None and latencies[name].append(time.perf_counter() - start))
+                queued.append((name, result))
+                continue
+            latencies[name].append(time.perf_counter() - start) # list.append is atomic
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    Article.disable_write_behind() # Drains queued writes before the process reports
+    for name, future in queued:
+        if future.exception() is not None: # Write-behind failures only show up on the Future
+            count_error(name, future.exception())
+    return {"latencies": latencies, "errors": errors, "stats": connection.stats()}
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))]
+
+def summarize(results, duration):
+    report = {}
+    for name in results[0]["latencies"]:
+        samples = sorted(value for result in results for value in result["latencies"][name])
+        report[name] = {
+            "ops": len(samples),
+            "ops/s": round(len(samples) / duration, 1),
+            "p50 ms": round(percentile(samples, 50) * 1000, 3),
+            "p95 ms": round(percentile(samples, 95) * 1000, 3),
+            "p99 ms": round(percentile(samples, 99) * 1000, 3),
+            "locked": sum(result["errors"][name]["locked"] for result in results),
+            "errors": sum(result["errors"][name]["other"] for result in results),
+        }
+    totals = {
+        "ops/s": round(sum(row["ops"] for row in report.values()) / duration, 1),
+        "locked errors": sum(row["locked"] for row in report.values()),
+        "transactions": sum(result["stats"]["transactions"] for result in results),
+        "lock wait (s)": round(sum(result["stats"]["lock_wait_seconds"] for result in results), 3),
+        "retries": sum(result["stats"]["retries"] for result in results),
+        "retry wait (s)": round(sum(result["stats"]["retry_wait_seconds"] for result in results), 3),
+    }
+    return report, totals
+
+def run(profile, cache, mix, processes, threads, duration):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.db")
+        seed(path)
+        if cache == "catalog":
+            from lib.db import catalog
+            connection.DATABASE = path
+            catalog.build(path + ".catalog")
+            connection.close_all()
+        # spawn, not fork: every worker starts with clean connections and no inherited threads
+        with ProcessPoolExecutor(processes, mp_context=get_context("spawn")) as executor:
+            futures = [
+                executor.submit(run_process, path, profile, cache, mix, threads, duration, i)
+                for i in range(processes)
+            ]
+            results = [future.result() for future in futures]
+    return summarize(results, duration)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent mixed read/write load test.")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="threads per process")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights, e.g. {DEFAULT_MIX}")
+    parser.add_argument("--profile", nargs="+", choices=sorted(PROFILES), default=["pooled"])
+    parser.add_argument("--cache", nargs="+", choices=CACHES, default=["warm"])
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+    for profile in args.profile:
+        for cache in args.cache:
+            report, totals = run(profile, cache, mix, args.processes, args.threads, args.duration)
+            print(f"== profile={profile} cache={cache} ({args.processes} processes x {args.threads} threads, {args.duration}s)")
+            print(f"{'operation':<14}" + "".join(f"{column:>10}" for column in next(iter(report.values()))))
+            for name, row in report.items():
+                print(f"{name:<14}" + "".join(f"{value:>10}" for value in row.values()))
+            for label, value in totals.items():
+                print(f"{label}: {value}")
+
+if __name__ == "__main__":
+    main()
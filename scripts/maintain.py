@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.db import maintenance
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ANALYZE, incremental vacuum and WAL checkpoint for articles.db.")
+    parser.add_argument("--full-analyze", action="store_true", help="ANALYZE every table instead of PRAGMA optimize")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip the incremental vacuum")
+    parser.add_argument("--checkpoint", choices=maintenance.CHECKPOINT_MODES, default="TRUNCATE")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert a database created without auto_vacuum=INCREMENTAL (runs a full VACUUM)")
+    args = parser.parse_args(argv)
+
+    if args.enable_incremental_vacuum and maintenance.enable_incremental_vacuum():
+        print("Converted database to auto_vacuum=INCREMENTAL.")
+    report = maintenance.run(args.full_analyze, not args.no_vacuum, args.checkpoint)
+
+    before, after = report["pages_before"], report["pages_after"]
+    print(f"auto_vacuum: {after['auto_vacuum']}")
+    print(f"pages: {before['page_count']} -> {after['page_count']} (free {before['freelist_count']} -> {after['freelist_count']})")
+    print(f"reclaimed: {report['reclaimed_pages']} pages, {report['reclaimed_bytes']} bytes")
+    print(f"checkpoint: {report['checkpoint']}")
+    print(f"maintenance took {report['maintenance_seconds']}s")
+    for name, result in report["queries"].items():
+        print(f"== {name}: {result['before']['latency_ms']} ms -> {result['after']['latency_ms']} ms")
+        if result["before"]["plan"] != result["after"]["plan"]:
+            print("   plan before: " + "; ".join(result["before"]["plan"]))
+        print("   plan: " + "; ".join(result["after"]["plan"]))
+
+if __name__ == "__main__":
+    main()
@@ -156,3 +156,128 @@ def test_author_topic_areas(setup_db):
     assert len(topic_areas) == 3 
     author_no_articles = Author.create("No Articles Author")
     assert author_no_articles.topic_areas() == []
+
+def test_author_get_or_create(setup_db):
+    author = Author.create("Existing Author")
+    assert Author.get_or_create("Existing Author") is author
+    created = Author.get_or_create("Brand New Author")
+    assert created.id is not None
+    assert Author.find_by_name("Brand New Author").id == created.id
+    assert len(Author.get_all()) == 2
+
+def test_author_upsert_many(setup_db):
+    existing = Author.create("Author Two")
+    names = [f"Author {i}" for i in range(2000)] + ["Author Two", "Author 5"]
+    authors = Author.upsert_many(names)
+    assert [a.name for a in authors] == names
+    assert authors[-2].id == existing.id
+    assert authors[-1] is authors[5]
+    assert len(Author.get_all()) == 2001
+    from lib.db.changelog import latest_seq
+    seq = latest_seq()
+    assert Author.upsert_many(names) == authors
+    assert len(Author.get_all()) == 2001
+    assert latest_seq() == seq # Existing names are not rewritten
+
+def test_author_delete_where_cascades(setup_db):
+    from lib.models.magazine import Magazine
+    from lib.models.article import Article
+
+    author1 = Author.create("Purged Author")
+    author2 = Author.create("Kept Author")
+    magazine = Magazine.create("Cascade Mag", "Tech")
+    Article.create("Purged Article", "Content", author1.id, magazine.id)
+    kept = Article.create("Kept Article", "Content", author2.id, magazine.id)
+
+    assert Author.delete_where(name__in=["Purged Author"]) == 1
+    assert [a.id for a in Author.get_all()] == [author2.id]
+    assert [a.id for a in Article.get_all()] == [kept.id]
+
+def test_author_find_by_ids(setup_db):
+    author1 = Author.create("Batch One")
+    author2 = Author.create("Batch Two")
+    Author._all_authors.clear()
+    found = Author.find_by_ids([author2.id, 999999, author1.id])
+    assert [a.name if a else None for a in found] == ["Batch Two", None, "Batch One"]
+
+def test_author_recommended_magazines(setup_db):
+    from lib.models.magazine import Magazine
+    from lib.models.article import Article
+
+    author = Author.create("Recommended Author")
+    other = Author.create("Busy Author")
+    tech1 = Magazine.create("Tech One", "Technology")
+    tech2 = Magazine.create("Tech Two", "Technology")
+    tech3 = Magazine.create("Tech Three", "Technology")
+    art = Magazine.create("Art One", "Art")
+    art2 = Magazine.create("Art Two", "Art")
+
+    Article.create("Tech Article 1", "Content", author.id, tech1.id)
+    Article.create("Tech Article 2", "Content", author.id, tech1.id)
+    Article.create("Art Article 1", "Content", author.id, art.id)
+    Article.create("Busy Article 1", "Content", other.id, tech3.id)
+    Article.create("Busy Article 2", "Content", other.id, tech3.id)
+
+    recommended = author.recommended_magazines()
+    assert [m.name for m in recommended] == ["Tech Three", "Tech Two", "Art Two"]
+    assert [m.name for m in author.recommended_magazines(1)] == ["Tech Three"]
+
+    # The index follows category changes and deletes incrementally
+    Magazine.update_where({"category": "Art"}, id=tech1.id)
+    assert sorted(author.topic_areas()) == ["Art"]
+    assert [m.name for m in author.recommended_magazines()] == ["Art Two"]
+    Article.delete_where(author_id=author.id)
+    assert author.topic_areas() == []
+    assert author.recommended_magazines() == []
+
+def test_recommendation_index_rebuild(setup_db):
+    from lib.models.magazine import Magazine
+    from lib.models.article import Article
+    from lib.analytics.recommendations import rebuild
+
+    author = Author.create("Rebuilt Author")
+    magazine = Magazine.create("Rebuilt Mag", "Tech")
+    other = Magazine.create("Other Mag", "Tech")
+    Article.create("Rebuilt Article", "Content", author.id, magazine.id)
+    before = author.recommended_magazines()
+    assert rebuild() == {"author_category_weights": 1, "magazine_activity": 2}
+    assert [m.id for m in author.recommended_magazines()] == [m.id for m in before] == [other.id]
+
+def test_author_built_with_id_saves(setup_db):
+    original = Author.create("Old Name")
+    Author("New Name", id=original.id).save()
+    Author._all_authors.clear()
+    assert Author.find_by_id(original.id).name == "New Name"
+
+def test_author_rolled_back_by_outer_transaction_leaves_no_cache(setup_db):
+    from lib.db.connection import transaction
+    kept = Author.create("Kept Author")
+    with pytest.raises(RuntimeError):
+        with transaction():
+            added = Author.create("Rolled Back Author")
+            kept.delete()
+            raise RuntimeError("roll back")
+    assert added.id is None
+    assert Author.find_by_name("Rolled Back Author") is None
+    assert kept.id is not None and Author.find_by_id(kept.id) is kept
+
+def test_author_delete_works_without_returning(setup_db, monkeypatch):
+    from lib.db import bulk
+    from lib.db.connection import get_writer
+    from lib.models.article import Article
+    from lib.models.magazine import Magazine
+    monkeypatch.setattr(bulk, "RETURNING_SUPPORTED", False) # As on SQLite older than 3.35
+    author = Author.create("Old SQLite Author")
+    article = Article.create("Old SQLite Article", "Content", author.id, Magazine.create("Old Mag", "Tech").id)
+    statements = []
+    get_writer().set_trace_callback(statements.append)
+    try:
+        assert Author.update_where({"name": "Older SQLite Author"}, id=author.id) == 1
+        author = Author.find_by_id(author.id)
+        author.delete()
+    finally:
+        get_writer().set_trace_callback(None)
+    assert article.id is None and Author.find_by_name("Older SQLite Author") is None
+    assert not [sql for sql in statements if "RETURNING" in sql]
+    with pytest.raises(RuntimeError, match="3.35"):
+        Author.get_or_create("Upserted Author")
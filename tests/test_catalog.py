@@ -0,0 +1,94 @@
+import pytest
+from lib.models.author import Author
+from lib.models.magazine import Magazine
+from lib.models.article import Article
+from lib.db.connection import get_connection
+from lib.db import catalog
+
+
+@pytest.fixture
+def setup_db():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+    yield
+    catalog.use(None)
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+
+
+def test_build_and_lookup(setup_db, tmp_path):
+    author = Author.create("Snapshot Ünïcode")
+    magazine = Magazine.create("Snapshot Mag", "Tech")
+    article = Article.create("Snapshot Article", "Content", author.id, magazine.id)
+    path = tmp_path / "catalog.snapshot"
+    assert catalog.build(str(path)) == {"authors": 1, "magazines": 1, "articles": 1}
+
+    snapshot = catalog.CatalogSnapshot(str(path))
+    try:
+        assert snapshot.author(author.id) == {"id": author.id, "name": "Snapshot Ünïcode"}
+        assert snapshot.magazine(magazine.id) == {"id": magazine.id, "name": "Snapshot Mag", "category": "Tech"}
+        assert snapshot.article_refs(article.id) == (author.id, magazine.id)
+        assert snapshot.author(999999) is None
+        assert snapshot.magazine("not an id") is None
+    finally:
+        snapshot.close()
+
+def test_find_by_id_reads_snapshot_first(setup_db, tmp_path):
+    author = Author.create("Catalog Author")
+    magazine = Magazine.create("Catalog Mag", "Tech")
+    path = tmp_path / "catalog.snapshot"
+    catalog.build(str(path))
+
+    # Change the database behind the snapshot's back to see which one answers
+    conn = get_connection()
+    conn.execute("UPDATE authors SET name = 'Renamed Author' WHERE id = ?", (author.id,))
+    conn.commit()
+    conn.close()
+    Author._all_authors.clear()
+    Magazine._all_magazines.clear()
+
+    catalog.use(str(path))
+    found = Author.find_by_id(author.id)
+    assert found.name == "Catalog Author"
+    assert author.id not in Author._all_authors
+    assert Magazine.find_by_id(magazine.id).category == "Tech"
+
+    late = Author.create("Late Author")
+    Author._all_authors.clear()
+    assert Author.find_by_id(late.id).name == "Late Author"
+
+    catalog.use(None)
+    assert Author.find_by_id(author.id).name == "Renamed Author"
+
+def test_local_deletes_and_updates_hide_snapshot_rows(setup_db, tmp_path):
+    doomed = Author.create("Doomed Author")
+    renamed = Author.create("Before Rename")
+    path = tmp_path / "catalog.snapshot"
+    catalog.build(str(path))
+    catalog.use(str(path))
+    try:
+        doomed_id = doomed.id
+        doomed.delete()
+        assert Author.find_by_id(doomed_id) is None
+        assert Author.find_by_ids([doomed_id]) == [None]
+        Author.update_where({"name": "After Rename"}, id=renamed.id)
+        assert Author.find_by_id(renamed.id).name == "After Rename"
+        assert [a.name for a in Author.find_by_ids([renamed.id])] == ["After Rename"]
+    finally:
+        catalog.use(None)
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bogus.snapshot"
+    path.write_bytes(b"\0" * 256)
+    with pytest.raises(ValueError):
+        catalog.CatalogSnapshot(str(path))
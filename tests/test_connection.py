@@ -0,0 +1,174 @@
+import os
+import subprocess
+import sys
+import threading
+import pytest
+import sqlite3
+from lib.models.author import Author
+from lib.models.magazine import Magazine
+from lib.models.article import Article
+from lib.db.connection import get_connection, reader, snapshot, fetch_all, stats, reset_stats, configure, transaction, after_commit, on_rollback, holds_writer, in_write_transaction
+
+
+@pytest.fixture
+def setup_db():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+    yield
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+
+
+def test_reader_is_read_only(setup_db):
+    with reader() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO authors (name) VALUES ('Nope')")
+
+def test_reads_see_committed_writes(setup_db):
+    author = Author.create("Reader Author")
+    rows = fetch_all("SELECT * FROM authors WHERE id = ?", (author.id,))
+    assert len(rows) == 1
+
+def test_snapshot_is_consistent(setup_db):
+    author = Author.create("Snapshot Author")
+    magazine = Magazine.create("Snap Mag", "Tech")
+    Article.create("Before Snapshot", "Content", author.id, magazine.id)
+
+    with snapshot():
+        assert len(magazine.authors()) == 1
+        Article.create("During Snapshot", "Content", Author.create("Late Author").id, magazine.id)
+        assert len(magazine.authors()) == 1
+        assert magazine.article_titles() == ["Before Snapshot"]
+
+    assert len(magazine.authors()) == 2
+
+def test_import_does_not_open_database(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run(
+        [sys.executable, "-c", "import lib.models.article"],
+        cwd=tmp_path, env={**os.environ, "PYTHONPATH": root}, check=True,
+    )
+    assert not (tmp_path / "articles.db").exists()
+
+def test_connections_are_recreated_after_fork(setup_db):
+    from lib.db.connection import get_writer
+    parent_writer = get_writer()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = get_writer() is not parent_writer and Author.create("Forked Author").id is not None
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1) == b"1"
+    assert get_writer() is parent_writer
+    assert Author.find_by_name("Forked Author") is not None
+
+def test_write_stats_count_transactions(setup_db):
+    reset_stats()
+    Author.create("Stats Author")
+    Author.create("Stats Author Two")
+    counters = stats()
+    assert counters["transactions"] == 2
+    assert counters["lock_wait_seconds"] >= 0.0
+
+def test_busy_writer_retries_with_backoff(setup_db):
+    blocker = sqlite3.connect("articles.db", isolation_level=None, check_same_thread=False)
+    configure(busy_timeout_ms=0, max_retries=8, backoff_base_ms=5, backoff_max_ms=50)
+    try:
+        reset_stats()
+        blocker.execute("BEGIN IMMEDIATE")
+        threading.Timer(0.05, blocker.execute, ("COMMIT",)).start()
+        author = Author.create("Patient Author")
+        counters = stats()
+        assert author.id is not None
+        assert counters["retries"] > 0 and counters["retry_wait_seconds"] > 0
+        assert counters["busy_failures"] == 0
+    finally:
+        configure()
+        blocker.close()
+
+def test_busy_writer_gives_up_after_max_retries(setup_db):
+    blocker = sqlite3.connect("articles.db", isolation_level=None)
+    configure(busy_timeout_ms=0, max_retries=0)
+    try:
+        reset_stats()
+        blocker.execute("BEGIN IMMEDIATE")
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            Author.create("Impatient Author")
+        assert stats()["busy_failures"] == 1
+        blocker.execute("ROLLBACK")
+        assert Author.find_by_name("Impatient Author") is None
+    finally:
+        configure()
+        blocker.close()
+
+def test_failed_begin_does_not_keep_the_writer(setup_db):
+    blocker = sqlite3.connect("articles.db", isolation_level=None)
+    configure(busy_timeout_ms=0, max_retries=0)
+    try:
+        blocker.execute("BEGIN IMMEDIATE")
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            with transaction():
+                pass
+        assert not holds_writer()
+        assert not in_write_transaction()
+        blocker.execute("ROLLBACK")
+    finally:
+        configure()
+        blocker.close()
+
+def test_nested_transaction_joins_outer(setup_db):
+    with pytest.raises(RuntimeError):
+        with transaction() as cursor:
+            cursor.execute("INSERT INTO authors (name) VALUES ('Outer Author')")
+            with transaction() as inner:
+                inner.execute("INSERT INTO authors (name) VALUES ('Inner Author')")
+            raise RuntimeError("roll back both")
+    assert fetch_all("SELECT * FROM authors WHERE name IN ('Outer Author', 'Inner Author')") == []
+
+def test_reads_inside_transaction_see_own_writes(setup_db):
+    with transaction():
+        Author.create("Uncommitted Author")
+        assert Author.find_by_name("Uncommitted Author") is not None
+        assert len(fetch_all("SELECT * FROM authors WHERE name = 'Uncommitted Author'")) == 1
+        with reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM authors WHERE name = 'Uncommitted Author'").fetchone()[0] == 1
+        with snapshot():
+            assert Author.find_by_name("Uncommitted Author") is not None
+
+def test_max_variables_does_not_open_writer(setup_db):
+    from lib.db import connection
+    connection.close_all()
+    assert connection.max_variables() >= 999
+    assert connection._writer is None
+
+def test_commit_and_rollback_hooks_follow_the_outer_transaction(setup_db):
+    events = []
+    after_commit(lambda: events.append("now"))
+    on_rollback(lambda: events.append("never"))
+    with transaction():
+        after_commit(lambda: events.append("committed"))
+        with transaction():
+            on_rollback(lambda: events.append("never"))
+            after_commit(lambda: events.append("inner committed"))
+        assert events == ["now"]
+    assert events == ["now", "committed", "inner committed"]
+    with pytest.raises(RuntimeError):
+        with transaction():
+            on_rollback(lambda: events.append("first"))
+            with transaction():
+                on_rollback(lambda: events.append("second"))
+            after_commit(lambda: events.append("never"))
+            raise RuntimeError("roll back")
+    assert events[3:] == ["second", "first"]
@@ -3,7 +3,7 @@ import sqlite3
 from lib.models.magazine import Magazine
 from lib.models.author import Author 
 from lib.models.article import Article 
-from lib.db.connection import get_connection
+from lib.db.connection import get_connection, reader, snapshot
 
 @pytest.fixture
 def setup_db():
@@ -187,4 +187,133 @@ def test_magazine_contributing_authors(setup_db):
     author_only_one = Author.create("Only One Article")
     Article.create("One Article", "Content", author_only_one.id, magazine_no_contributors.id)
     
-    assert magazine_no_contributors.contributing_authors() is None
\ No newline at end of file
+    assert magazine_no_contributors.contributing_authors() is None
+
+def test_magazine_get_or_create(setup_db):
+    magazine = Magazine.create("Existing Mag", "Tech")
+    found = Magazine.get_or_create("Existing Mag", "Other")
+    assert found.id == magazine.id
+    assert found.category == "Tech"
+    created = Magazine.get_or_create("Fresh Mag", "News")
+    assert Magazine.find_by_name("Fresh Mag").id == created.id
+
+def test_magazine_upsert_many(setup_db):
+    existing = Magazine.create("Mag 1", "Old Cat")
+    magazines = Magazine.upsert_many([("Mag 1", "New Cat"), ("Mag 2", "Tech"), ("Mag 3", "Art")])
+    assert [m.name for m in magazines] == ["Mag 1", "Mag 2", "Mag 3"]
+    assert magazines[0].id == existing.id
+    assert magazines[0].category == "New Cat"
+    conn = get_connection()
+    row = conn.execute("SELECT category FROM magazines WHERE id = ?", (existing.id,)).fetchone()
+    conn.close()
+    assert row['category'] == "New Cat"
+    assert len(Magazine.get_all()) == 3
+
+    from lib.db.changelog import changes_since, latest_seq
+    seq = latest_seq()
+    again = Magazine.upsert_many([("Mag 1", "New Cat"), ("Mag 2", "Tech"), ("Mag 3", "Science")])
+    assert again == magazines
+    assert [(c['entity_id'], c['op']) for c in changes_since(seq)] == [(magazines[2].id, 'update')]
+    assert magazines[2].category == "Science"
+
+def test_magazine_delete_cascades_to_articles(setup_db):
+    author = Author.create("Cascade Author")
+    magazine = Magazine.create("Cascade Mag", "Tech")
+    other = Magazine.create("Other Mag", "Tech")
+    articles = [Article.create(f"Cascade {i}", "Content", author.id, magazine.id) for i in range(4)]
+    survivor = Article.create("Survivor", "Content", author.id, other.id)
+
+    magazine.delete()
+    assert magazine.id is None
+    assert all(a.id is None for a in articles)
+    assert [a.id for a in Article.get_all()] == [survivor.id]
+
+def test_magazine_update_where(setup_db):
+    Magazine.create("Mag A", "Old")
+    Magazine.create("Mag B", "Old")
+    Magazine.create("Mag C", "Keep")
+    assert Magazine.update_where({"category": "New"}, category="Old") == 2
+    with pytest.raises(ValueError):
+        Magazine.update_where({"category": "Everything"})
+    with pytest.raises(ValueError):
+        Magazine.update_where({"id": 999999}, category="New")
+    assert sorted(m.category for m in Magazine.get_all()) == ["Keep", "New", "New"]
+
+def test_magazine_article_titles_order_limit_and_empty(setup_db):
+    author = Author.create("Titles Order Author")
+    magazine = Magazine.create("Order Mag", "Tech")
+    assert magazine.article_titles() == []
+    for title in ("Bravo", "Alpha", "Charlie"):
+        Article.create(title, "Content", author.id, magazine.id)
+    assert magazine.article_titles() == ["Bravo", "Alpha", "Charlie"]
+    assert magazine.article_titles("-id", limit=2) == ["Charlie", "Alpha"]
+    assert magazine.article_titles("title") == ["Alpha", "Bravo", "Charlie"]
+    assert magazine.article_titles("-title", limit=1) == ["Charlie"]
+    with pytest.raises(ValueError):
+        magazine.article_titles("content")
+
+def test_magazine_article_titles_reads_only_the_covering_index(setup_db):
+    magazine = Magazine.create("Index Mag", "Tech")
+    statements = []
+    with reader() as conn:
+        conn.set_trace_callback(statements.append) # article_titles() takes this pooled connection next
+    try:
+        magazine.article_titles()
+    finally:
+        conn.set_trace_callback(None)
+    assert len(statements) == 1
+    with reader() as conn:
+        plan = [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {statements[0]}")]
+    assert plan == ["SEARCH articles USING COVERING INDEX idx_articles_magazine_titles (magazine_id=?)"]
+
+def test_magazine_title_cache_evicts_least_recently_used(setup_db):
+    magazines = [Magazine.create(f"LRU Mag {i}", "Tech") for i in range(3)]
+    Magazine.enable_title_cache(size=2)
+    try:
+        magazines[0].article_titles()
+        magazines[1].article_titles()
+        magazines[0].article_titles() # Hit: now the most recently used
+        magazines[2].article_titles()
+        assert list(Magazine._title_cache) == [magazines[0].id, magazines[2].id]
+    finally:
+        Magazine.disable_title_cache()
+
+def test_magazine_title_cache_follows_article_writes(setup_db):
+    author = Author.create("Cache Titles Author")
+    magazine = Magazine.create("Cache Mag", "Tech")
+    other = Magazine.create("Other Mag", "Tech")
+    first = Article.create("First", "Content", author.id, magazine.id)
+    Magazine.enable_title_cache(size=1)
+    try:
+        assert magazine.article_titles() == ["First"]
+        assert magazine.id in Magazine._title_cache
+        second = Article.create("Second", "Content", author.id, magazine.id)
+        first.title = "First Edited"
+        first.save()
+        assert magazine.article_titles() == ["First Edited", "Second"]
+
+        second.delete()
+        assert magazine.article_titles() == ["First Edited"]
+        first.magazine_id = other.id
+        first.save()
+        assert magazine.article_titles() == []
+        assert other.article_titles() == ["First Edited"]
+        assert list(Magazine._title_cache) == [other.id] # size=1 evicted the other magazine
+
+        Article.update_where({"title": "Bulk Edited"}, magazine_id=other.id)
+        assert other.article_titles() == ["Bulk Edited"]
+        with snapshot():
+            Article.create("During Snapshot", "Content", author.id, other.id)
+            assert other.article_titles() == ["Bulk Edited"]
+        assert other.article_titles() == ["Bulk Edited", "During Snapshot"]
+        author.delete()
+        assert other.article_titles() == []
+    finally:
+        Magazine.disable_title_cache()
+
+def test_magazine_built_with_id_saves(setup_db):
+    original = Magazine.create("Old Mag", "Old")
+    Magazine("New Mag", "New", id=original.id).save()
+    Magazine._all_magazines.clear()
+    reloaded = Magazine.find_by_id(original.id)
+    assert (reloaded.name, reloaded.category) == ("New Mag", "New")
@@ -0,0 +1,106 @@
+import pytest
+from lib.db import maintenance
+from lib.db.connection import get_connection, transaction
+
+
+@pytest.fixture
+def setup_db():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+    yield
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+
+def bulk_insert_and_delete(count=2000):
+    with transaction() as cursor:
+        cursor.execute("INSERT INTO authors (name) VALUES ('Bulk Author')")
+        author_id = cursor.lastrowid
+        cursor.execute("INSERT INTO magazines (name, category) VALUES ('Bulk Mag', 'Bulk')")
+        magazine_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO articles (title, content, author_id, magazine_id) VALUES ('Bulk', ?, ?, ?)",
+            (("x" * 500, author_id, magazine_id) for _ in range(count)),
+        )
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM articles WHERE author_id = ?", (author_id,))
+
+
+def test_schema_uses_incremental_auto_vacuum(setup_db):
+    assert maintenance.page_stats()["auto_vacuum"] == "incremental"
+    assert maintenance.enable_incremental_vacuum() is False
+
+def test_incremental_vacuum_reclaims_freed_pages(setup_db):
+    bulk_insert_and_delete()
+    free = maintenance.page_stats()["freelist_count"]
+    assert free > 10
+    assert maintenance.incremental_vacuum(10) == 10
+    assert maintenance.incremental_vacuum() == free - 10
+    assert maintenance.page_stats()["freelist_count"] == 0
+
+def test_run_reports_pages_plans_and_latency(setup_db):
+    bulk_insert_and_delete()
+    report = maintenance.run(full_analyze=True)
+    assert report["reclaimed_pages"] > 0
+    assert report["pages_after"]["page_count"] < report["pages_before"]["page_count"]
+    assert report["checkpoint"]["busy"] is False
+    for name in maintenance.PROBE_QUERIES:
+        assert report["queries"][name]["after"]["plan"]
+        assert report["queries"][name]["after"]["latency_ms"] >= 0
+
+def test_checkpoint_rejects_unknown_mode(setup_db):
+    with pytest.raises(ValueError):
+        maintenance.checkpoint("EVENTUALLY")
+
+def test_autocheckpoint_pages_is_bounded():
+    assert maintenance.autocheckpoint_pages(0) == maintenance.MIN_AUTOCHECKPOINT
+    assert maintenance.autocheckpoint_pages(100) == 100 * maintenance.CHECKPOINT_TARGET_SECONDS
+    assert maintenance.autocheckpoint_pages(10 ** 6) == maintenance.MAX_AUTOCHECKPOINT
+
+def test_scheduler_analyzes_after_change_threshold(setup_db):
+    scheduler = maintenance.MaintenanceScheduler(interval_seconds=60, change_threshold=100, vacuum_threshold_pages=1)
+    assert scheduler.run_once()["analyzed"] is False
+    bulk_insert_and_delete(200)
+    report = scheduler.run_once()
+    assert report["analyzed"] is True
+    assert report["reclaimed_pages"] > 0
+    assert report["wal_autocheckpoint"] >= maintenance.MIN_AUTOCHECKPOINT
+    scheduler.start()
+    scheduler.stop()
+
+def test_pages_written_counts_log_growth_across_restarts():
+    def wal(pages, checkpointed, busy=False):
+        return {"busy": busy, "wal_pages": pages, "checkpointed": checkpointed}
+    assert maintenance.pages_written((3, wal(40, 10)), (3, wal(100, 100)), 1000) == 60
+    assert maintenance.pages_written((3, wal(40, 40)), (4, wal(25, 25)), 1000) == 25
+    assert maintenance.pages_written((3, wal(400, 10)), (5, wal(25, 25)), 1000) == 600 + 1000 + 25
+    assert maintenance.pages_written((3, wal(40, 40)), (None, wal(0, 0)), 1000) == 0
+
+def test_scheduler_rate_follows_pages_written(setup_db):
+    scheduler = maintenance.MaintenanceScheduler(interval_seconds=60, change_threshold=10 ** 9)
+    scheduler.run_once()
+    assert scheduler.run_once()["pages_written"] == 0
+    bulk_insert_and_delete(200)
+    assert scheduler.run_once()["pages_written"] > 0
+    assert scheduler.run_once()["pages_written"] == 0
+
+def test_maintenance_refuses_to_run_inside_transaction(setup_db):
+    from lib.db.connection import fetch_one
+    with pytest.raises(RuntimeError, match="roll back"):
+        with transaction() as cursor:
+            cursor.execute("INSERT INTO authors (name) VALUES ('Vacuumed Author')")
+            with pytest.raises(RuntimeError, match="inside transaction"):
+                maintenance.incremental_vacuum()
+            with pytest.raises(RuntimeError, match="inside transaction"):
+                maintenance.checkpoint()
+            raise RuntimeError("roll back")
+    assert fetch_one("SELECT COUNT(*) FROM authors WHERE name = 'Vacuumed Author'")[0] == 0
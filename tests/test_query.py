@@ -0,0 +1,79 @@
+import pytest
+from lib.models.author import Author
+from lib.models.magazine import Magazine
+from lib.models.article import Article
+from lib.db.connection import get_connection
+from lib.db.query import compiled_count
+
+
+@pytest.fixture
+def setup_db():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+    yield
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    conn.commit()
+    conn.close()
+
+@pytest.fixture
+def catalog(setup_db):
+    author1 = Author.create("Query Author 1")
+    author2 = Author.create("Query Author 2")
+    magazine1 = Magazine.create("Query Mag 1", "Tech")
+    magazine2 = Magazine.create("Query Mag 2", "Art")
+    magazine3 = Magazine.create("Query Mag 3", "Art")
+    articles = [
+        Article.create("Article One", "Content", author1.id, magazine1.id),
+        Article.create("Article Two", "Content", author1.id, magazine2.id),
+        Article.create("Article Three", "Content", author1.id, magazine3.id),
+        Article.create("Article Four", "Content", author2.id, magazine1.id),
+    ]
+    return author1, author2, [magazine1, magazine2, magazine3], articles
+
+
+def test_where_filters_and_orders(catalog):
+    author1, _, magazines, articles = catalog
+    query = Article.where(author_id=author1.id, magazine_id__in=[magazines[0].id, magazines[1].id])
+    found = query.order_by("-id").all()
+    assert [a.id for a in found] == [articles[1].id, articles[0].id]
+    assert all(isinstance(a, Article) for a in found)
+
+def test_limit_offset_and_first(catalog):
+    _, _, _, articles = catalog
+    assert [a.id for a in Article.where().order_by("id").limit(2).offset(1)] == [articles[1].id, articles[2].id]
+    assert Article.where(title="Article Four").first().id == articles[3].id
+    assert Article.where(title="Missing Title").first() is None
+
+def test_count_exists_values(catalog):
+    author1, author2, magazines, _ = catalog
+    assert Article.where(author_id=author1.id).count() == 3
+    assert Article.where(author_id=author1.id).limit(2).count() == 2
+    assert Article.where(author_id=author2.id).exists()
+    assert not Article.where(author_id=author2.id, magazine_id=magazines[2].id).exists()
+    assert Magazine.where(category="Art").order_by("name").values("name") == [("Query Mag 2",), ("Query Mag 3",)]
+
+def test_compiled_sql_is_cached_per_shape(catalog):
+    author1, author2, _, _ = catalog
+    Article.where(author_id=author1.id).count()
+    before = compiled_count()
+    Article.where(author_id=author2.id).count()
+    Article.where(author_id__in=[1]).count()
+    Article.where(author_id__in=[1, 2, 3]).count()
+    assert compiled_count() == before + 1
+
+def test_unknown_fields_are_rejected(setup_db):
+    with pytest.raises(ValueError):
+        Article.where(nope=1)
+    with pytest.raises(ValueError):
+        Article.where(title__like="x")
+    with pytest.raises(ValueError):
+        Article.where().order_by("nope")
@@ -0,0 +1,83 @@
+import pytest
+from lib.models.author import Author
+from lib.models.magazine import Magazine
+from lib.models.article import Article
+from lib.db.connection import get_connection
+
+similarity = pytest.importorskip("lib.analytics.similarity")
+
+
+@pytest.fixture
+def setup_db():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    cursor.execute("DELETE FROM author_similarity")
+    cursor.execute("DELETE FROM magazine_similarity")
+    conn.commit()
+    conn.close()
+    yield
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM articles")
+    cursor.execute("DELETE FROM authors")
+    cursor.execute("DELETE FROM magazines")
+    cursor.execute("DELETE FROM author_similarity")
+    cursor.execute("DELETE FROM magazine_similarity")
+    conn.commit()
+    conn.close()
+
+@pytest.fixture
+def catalog(setup_db):
+    authors = [Author.create(f"Similar Author {i}") for i in range(4)]
+    magazines = [Magazine.create(f"Sim Mag {i}", "Tech") for i in range(4)]
+    # Authors 0 and 1 share magazines 0 and 1; author 2 shares only magazine 1; author 3 is alone
+    for author, magazine in [(0, 0), (0, 1), (1, 0), (1, 1), (2, 1), (2, 2), (3, 3)]:
+        Article.create("Similar Article", "Content", authors[author].id, magazines[magazine].id)
+    return authors, magazines
+
+
+@pytest.mark.parametrize("use_sparse", [True, False])
+@pytest.mark.parametrize("metric", ["cosine", "jaccard"])
+def test_similar_authors(catalog, monkeypatch, use_sparse, metric):
+    if not use_sparse:
+        monkeypatch.setattr(similarity, "sparse", None)
+    elif similarity.sparse is None:
+        pytest.skip("scipy is not installed")
+    authors, _ = catalog
+    similarity.rebuild(k=5, metric=metric)
+    assert [a.id for a in authors[0].similar_authors()] == [authors[1].id, authors[2].id]
+    assert [a.id for a in authors[0].similar_authors(1)] == [authors[1].id]
+    assert authors[3].similar_authors() == []
+
+def test_similar_magazines(catalog):
+    _, magazines = catalog
+    similarity.rebuild(k=5)
+    assert [m.id for m in magazines[0].similar_magazines()] == [magazines[1].id]
+    assert [m.id for m in magazines[2].similar_magazines()] == [magazines[1].id]
+    assert magazines[3].similar_magazines() == []
+
+def test_cosine_scores(catalog):
+    authors, _ = catalog
+    author_ids, _, matrix = similarity.incidence_matrix()
+    sources, neighbours, scores = similarity.top_k(matrix, 3)
+    row = list(author_ids).index(authors[0].id)
+    found = {int(author_ids[n]): s for r, n, s in zip(sources, neighbours, scores) if r == row}
+    assert found[authors[1].id] == pytest.approx(1.0)
+    assert found[authors[2].id] == pytest.approx(0.5)
+
+def test_empty_database(setup_db):
+    assert similarity.rebuild() == {"author_similarity": 0, "magazine_similarity": 0}
+
+@pytest.mark.parametrize("metric", similarity.METRICS)
+def test_sparse_matches_dense(catalog, monkeypatch, metric):
+    if similarity.sparse is None:
+        pytest.skip("SciPy not installed")
+    _, _, matrix = similarity.incidence_matrix()
+    expected = [list(part) for part in similarity.top_k(matrix, 3, metric)]
+    monkeypatch.setattr(similarity, "sparse", None)
+    dense = [list(part) for part in similarity.top_k(matrix.toarray(), 3, metric)]
+    assert expected[0] == dense[0]
+    assert expected[2] == pytest.approx(dense[2])